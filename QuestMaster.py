@@ -1,54 +1,47 @@
 #from ReflectionAgent import reflectionAgent
-from langchain_ollama import ChatOllama
-from pydantic import BaseModel, ValidationError
+from pydantic import ValidationError
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.messages import AIMessage
-from typing import List,Dict, Tuple
-import subprocess
+from typing import List,Dict, Optional, Tuple
 import os
 import json
 import sys
 import re
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv 
-from langgraph.graph import StateGraph, END
-from flask import Flask, request, jsonify, render_template_string, redirect
-from collections import defaultdict
-from flask_cors import CORS
-from langgraph.pregel import Pregel
-from typing import TypedDict
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from typing import TYPE_CHECKING, TypedDict
 import logging
-
-
-app = Flask(__name__)
-
-CORS(app) 
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from story_graph import StoryStreamParser, evict_graph_cache, load_graph_payload, parse_story
+from graph_api import graph_response
+from wsgi import create_app
+from story_outline import NodeSection, OutlineNode, generate_sections, outline_summary, parse_json_object, parse_outline
+from jobs import jobs
+from workspace import Workspace
+from llm_cache import CachedLLM, make_cache
+from token_usage import TokenUsage
+from prompt_context import story_context, trim_planner_log
+from pddl_models import PDDLDomain, PDDLProblem, parse_pddl_domain, parse_pddl_problem, render_pddl_domain, render_pddl_problem
+from pddl_text import same_domain_structure, strip_fences
+from pddl_autofix import autofix_pddl_text
+from planner import PLANNER_OPTIMAL, get_plan_cache, run_fast_downward
+from planner_service import get_planner_service
+from strips_planner import check_sections, run_local_planner
+from state_graph import STATE_GRAPH_FILE, build_state_graph, verify_story, write_state_graph
+from pddl_validator import PDDLDiagnostic, format_diagnostics, has_errors, validate_pddl
+
+# langchain_openai e langgraph costano più di un secondo di import: si caricano alla prima generazione
+if TYPE_CHECKING:
+    from langgraph.pregel import Pregel
+
+
+# Route della generazione; l'app Flask si crea con create_app() in wsgi.py
+generation_api = Blueprint("generation", __name__)
 
 load_dotenv()
 
 sys.excepthook = sys.__excepthook__
 
-# Pydantic models
-class PDDLAction(BaseModel):
-    name: str
-    parameters: List[str]
-    preconditions: List[str]
-    effects: List[str]
-
-class PDDLDomain(BaseModel):
-    domain_name: str
-    requirements: List[str]
-    types: List[str]
-    predicates: List[str]
-    actions: List[PDDLAction]
-
-class PDDLProblem(BaseModel):
-    problem_name: str
-    domain_name: str
-    objects: Dict[str,str]
-    init: List[str]
-    goal: List[str]
-
 class PlanningState(TypedDict):
     lore_text: str
     story: str
@@ -59,20 +52,36 @@ class PlanningState(TypedDict):
     plan_success: bool
     stdout: str
     stderr: str
+    job_id: str
+    workspace: Workspace
+    diagnostics: List[PDDLDiagnostic]
+    token_usage: TokenUsage
+
+# La narrativa si legge quando parte una generazione, non all'import
+LORE_FILE = os.getenv("QUESTMASTER_LORE", "lore.txt")
 
-# Carica la narrativa
-try:
-    with open("lore.txt", "r", encoding="utf-8") as file:
-        lore_text = file.read()
-except FileNotFoundError:
-    print("Errore: Il file 'lore.txt' non è stato trovato.")
-    exit(1)
+def read_lore(path: str = LORE_FILE) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return file.read()
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Errore: Il file '{path}' non è stato trovato.")
 
 
-#llm = ChatOllama(model="llama3.2")
+# Client LLM creato alla prima chiamata, non all'import del modulo
+_llm: Optional[CachedLLM] = None
+_llm_lock = threading.Lock()
 
-#llm = ChatOpenAI(model="gpt-4o", temperature=0)
-llm = ChatOpenAI(model="gpt-4.1-mini", temperature=0)
+def get_llm() -> CachedLLM:
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            from langchain_openai import ChatOpenAI
+            #from langchain_ollama import ChatOllama
+            #_llm = CachedLLM(ChatOllama(model="llama3.2"), cache=make_cache())
+            #_llm = CachedLLM(ChatOpenAI(model="gpt-4o", temperature=0), cache=make_cache())
+            _llm = CachedLLM(ChatOpenAI(model="gpt-4.1-mini", temperature=0, stream_usage=True), cache=make_cache())
+        return _llm
 
 
 
@@ -147,7 +156,7 @@ INPUT: Narrative
 
 {narrative}
 """),
-    ("user", "{narrative}")
+    ("user", "Generate the PDDL domain for the narrative above.")
 ])
 
 # Prompt problema
@@ -238,9 +247,7 @@ Narrative:
 Domain:
 {domain}
 """),
-    ("user", "{lore}"),
-    ("user", "{narrative}"),
-    ("user", "{domain}")
+    ("user", "Generate the PDDL problem for the lore, narrative and domain above.")
 ])
 
 generate_story_prompt = ChatPromptTemplate.from_messages([
@@ -330,13 +337,77 @@ Here is the Lore Document:
     ("user", "{lore}")
 ])
 
-def comment():
+# Generazione in due fasi: scaletta (stati e archi) e poi un testo per ogni nodo
+story_outline_prompt = ChatPromptTemplate.from_messages([
+    ("system", """
+You are a story creator who must plan a simple, interactive story based on the Lore Document, designed to produce a robust and consistent PDDL problem and domain.
+
+The Lore Document includes the initial state, objective, obstacles and world context of a quest, a branching factor (minimum and maximum number of choices per step) and depth constraints (minimum and maximum number of steps to reach the objective).
+
+🎯 Your task: write ONLY the outline of the story, not its prose. The outline fixes:
+- The boolean state variables of the story (e.g., `medallion_found`, `native_trust_earned`, `wounded`), covering location, inventory, health, alliances and known information.
+- The numbered sections (1, 2, 3, ...), each one a distinct story state with the value of EVERY state variable.
+- The choices of each section, respecting the branching factor: a specific action translatable into a PDDL operator, the boolean flags it updates and the target section.
+
+🧩 Structure Rules:
+- Booleans must update logically across sections, and every choice must change the relevant flags.
+- Some paths may converge on the same section; choices must vary in risk or difficulty.
+- The path to success must respect the depth constraints and require moving to multiple locations, collecting items, solving puzzles, disarming traps, forming alliances, unlocking locations or performing a final ritual.
+- Avoid generic actions such as 'navigate-traps-and-puzzles' or 'discover-treasure' that allow shortcuts to the objective.
+- Include at least 3 distinct failure endings (early, midway and late) reachable by multiple paths, and at least one success ending that is not the shortest path.
+- Ending sections have no choices.
+
+🛍️ Format: return ONLY a JSON object like this one:
+{{
+  "state_variables": ["at_shore", "at_jungle_edge", "medallion_found"],
+  "nodes": [
+    {{
+      "id": 1,
+      "title": "Stranded on the shore",
+      "ending": null,
+      "state": {{"at_shore": true, "at_jungle_edge": false, "medallion_found": false}},
+      "choices": [
+        {{"action": "Walk to the jungle edge", "consequence": {{"at_shore": false, "at_jungle_edge": true}}, "target": 2}}
+      ]
+    }}
+  ]
+}}
+`ending` is null, "success" or "failure"; every `target` must be the id of a section in the outline.
+
+Here is the Lore Document:
+
+{lore}
+    """),
+    ("user", "{lore}")
+])
+
+story_node_prompt = ChatPromptTemplate.from_messages([
+    ("system", """
+You are a story creator writing ONE section of an interactive story. The structure of the story is already fixed by its outline: do not change states, choices or targets.
+
+🎭 Write for the given section:
+- A **Prerequisites** paragraph listing the conditions required to access this section, as narrative statements that correspond to its boolean flags.
+- A vivid **Narrative Description** (150-200 words) that immerses the reader in the scene (sounds, smells, emotions) and sets up the section's choices, using consistent names for places, objects and characters that align with PDDL.
+- For ending sections only, a one-sentence **Ending** that states the outcome.
+
+Return ONLY a JSON object: {{"prerequisites": "...", "narrative": "...", "ending": null}}
+
+Lore Document:
+{lore}
+
+Story outline:
+{outline}
+
+Section to write:
+{node}
+    """),
+    ("user", "Write section {node_id}.")
+])
+
+def comment(workspace: Workspace = Workspace(), usage: Optional[TokenUsage] = None):
     print("comment")
-    with open("domain.pddl", "r", encoding="utf-8") as file:
-        domain = file.read()
-   
-    with open("problem.pddl", "r", encoding="utf-8") as file:
-        problem = file.read()
+    domain = workspace.read("domain.pddl")
+    problem = workspace.read("problem.pddl")
 
     comment_prompt_domain = ChatPromptTemplate.from_messages([
     ("system", """You are an expert in PDDL (Planning Domain Definition Language).
@@ -384,31 +455,28 @@ Return only the commented problem file.
     ("user", "{prompt}")
 ])
     
-    domain_comment = llm.invoke(comment_prompt_domain.format_messages(domain=domain))
-    domain_comment_res= domain_comment.content.strip()
-
-    problem_comment = llm.invoke(comment_prompt_problem.format_messages(prompt=problem))
-    problem_comment_res= problem_comment.content.strip()
+    # Le due annotazioni sono indipendenti: vengono richieste in parallelo
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        domain_future = pool.submit(get_llm().invoke, comment_prompt_domain.format_messages(domain=domain), usage, "comment")
+        problem_future = pool.submit(get_llm().invoke, comment_prompt_problem.format_messages(prompt=problem), usage, "comment")
+        domain_comment_res = domain_future.result().content.strip()
+        problem_comment_res = problem_future.result().content.strip()
 
-    with open("commented_domain.pddl", "w", encoding="utf-8") as f:
-        f.write(domain_comment_res)
+    workspace.write("commented_domain.pddl", domain_comment_res)
+    workspace.write("commented_problem.pddl", problem_comment_res)
 
-    with open("commented_problem.pddl", "w", encoding="utf-8") as f:
-        f.write(problem_comment_res)
 
 
 
+# Correzione parallela di dominio e problema nel reflectionAgent
+SPECULATIVE_REPAIR = os.getenv("QUESTMASTER_SPECULATIVE_REPAIR", "1") == "1"
+repair_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="questmaster-repair")
 
-def reflectionAgent(error_log: str = "") -> Tuple[str, str, bool]:
+def reflectionAgent(error_log: str = "", workspace: Workspace = Workspace(), usage: Optional[TokenUsage] = None) -> Tuple[str, str, bool]:
     try:
-        with open("story.txt", "r", encoding="utf-8") as file:
-            story = file.read().strip()
-   
-        with open("domain.pddl", "r", encoding="utf-8") as file:
-            domain = file.read()
-   
-        with open("problem.pddl", "r", encoding="utf-8") as file:
-            problem = file.read()
+        story = workspace.read("story.txt").strip()
+        domain = workspace.read("domain.pddl")
+        problem = workspace.read("problem.pddl")
     except FileNotFoundError:
         return "Nessun piano trovato. La tua avventura termina qui.", "", False
     
@@ -441,10 +509,11 @@ Error Log:
 Story:
 {story}
 """),
-            ("user", "Domain:\n{domain}\nError Log:\n{error_log}\nStory:\n{story}")
+            ("user", "Domain:\n{domain}")
         ])
         
-        story_corr = llm.invoke(storyPrompt.format_messages(domain=domain, error_log=error_log, story=story))
+        story_corr = get_llm().invoke(storyPrompt.format_messages(domain=domain, error_log=trim_planner_log(error_log), story=story),
+                                usage=usage, stage="reflect")
         options = story_corr.content.strip()
 
         print("\n--- Suggerimenti automatici ---\n")
@@ -474,14 +543,13 @@ Original Story:
 Proposed Modifications:
 {options}
 """),
-("user", "Story:\n{story},Proposed Modifications:\n{options}")
+("user", "Rewrite the story applying the proposed modifications.")
 ])
-            story_corrV = llm.invoke(storyPromptGenerate.format_messages(story=story, options=options))
+            story_corrV = get_llm().invoke(storyPromptGenerate.format_messages(story=story, options=options), usage=usage, stage="reflect")
             story_fixed = story_corrV.content.strip()
             try:
-                with open("story.txt", "w") as f:
-                    f.write(story_fixed)
-                    return "","",True
+                workspace.write("story.txt", story_fixed)
+                return "","",True
             except Exception as e:
                 print("Errore nella storia:", e)
 
@@ -511,25 +579,30 @@ Proposed Modifications:
         Proposed Modifications:
         {options}
         """),
-                ("user", "Story:\n{story},Proposed Modifications:\n{options}")
+                ("user", "Rewrite the story applying the proposed modifications.")
             ])
             
-            story_corrV = llm.invoke(storyPromptGenerate.format_messages(story=story, options=user_mods))
+            story_corrV = get_llm().invoke(storyPromptGenerate.format_messages(story=story, options=user_mods), usage=usage, stage="reflect")
             story_fixed = story_corrV.content.strip()
 
             try:
-                with open("story.txt", "w") as f:
-                    f.write(story_fixed)
-                    return "", "", True
+                workspace.write("story.txt", story_fixed)
+                return "", "", True
             except Exception as e:
                 print("Errore nella storia:", e)
                 return "", "", False
   
 
+    # Contesto compatto: scheletro della storia e righe d'errore del log. La storia sta in fondo
+    # al messaggio di sistema, uguale a ogni iterazione (prefisso riusabile dalla cache del provider),
+    # mentre i documenti che cambiano vanno nel messaggio utente
+    story_ctx = story_context(story)
+    error_ctx = trim_planner_log(error_log)
+
     # Prompt per correggere il dominio
     domain_corr_prompt = ChatPromptTemplate.from_messages([
         ("system", """You are an expert in PDDL domain modeling.
-You are given a PDDL domain definition that may contain syntax or semantic errors with {story}.
+You are given a PDDL domain definition that may contain syntax or semantic errors, generated from the story below.
 
 You are also given an error log from a planner that tried to use the domain.
 
@@ -540,22 +613,19 @@ Your task:
 - Correct the domain so that it is valid and ready for a planner.
 - Return ONLY the corrected PDDL domain text, with no extra explanation or formatting.
 
-Error Log:
-{error_log}
-         
 Story:
 {story}
 """),
-        ("user", "{domain},{story},{error_log}")
+        ("user", "Domain:\n{domain}\n\nError Log:\n{error_log}")
     ])
 
-    domain_corr = llm.invoke(domain_corr_prompt.format_messages(domain=domain, error_log=error_log,story=story))
-    domain_fixed = domain_corr.content.strip()
+    domain_future = repair_executor.submit(get_llm().invoke, domain_corr_prompt.format_messages(domain=domain, error_log=error_ctx, story=story_ctx),
+                                           usage, "reflect")
 
     # Prompt per il problema
     problem_corr_prompt = ChatPromptTemplate.from_messages([
         ("system", """You are an expert in PDDL problem modeling.
-You are given a PDDL problem definition and its corresponding domain (which is correct)  with {story}.
+You are given a PDDL problem definition and its corresponding domain (which is correct), generated from the story below.
 
 You are also given the error log of a failed planning attempt.
 
@@ -566,175 +636,57 @@ Your task:
 - Return ONLY the corrected PDDL problem text, with no extra explanation or formatting.
 - You not duplicate objects.
 
-Domain:
-{domain}
-
-Error Log:
-{error_log}
-         
 Story:
 {story}
 """),
-        ("user", "{problem},{error_log},{story}")
+        ("user", "Domain:\n{domain}\n\nProblem:\n{problem}\n\nError Log:\n{error_log}")
     ])
 
-    problem_corr = llm.invoke(problem_corr_prompt.format_messages(
-        domain=domain_fixed,
-        problem=problem,
-        error_log=error_log,
-        story=story
-    ))
-
-    problem_fixed = problem_corr.content.strip()
+    def repair_problem(domain_text: str):
+        return get_llm().invoke(problem_corr_prompt.format_messages(
+            domain=domain_text,
+            problem=problem,
+            error_log=error_ctx,
+            story=story_ctx
+        ), usage=usage, stage="reflect")
+
+    # Modalità speculativa: il problema viene corretto sul dominio originale in parallelo
+    # e il risultato si tiene solo se la correzione non cambia tipi, predicati e costanti
+    problem_future = repair_executor.submit(repair_problem, domain) if SPECULATIVE_REPAIR else None
+
+    domain_fixed = domain_future.result().content.strip()
+
+    if problem_future is not None and same_domain_structure(domain, domain_fixed):
+        problem_fixed = problem_future.result().content.strip()
+    else:
+        # La correzione speculativa non serve più: si annulla se non è partita, altrimenti
+        # si aspetta (dopo la nuova correzione) perché i suoi token finiscano nei totali del job
+        speculative_running = problem_future is not None and not problem_future.cancel()
+        if problem_future is not None:
+            print("⚠️ Struttura del dominio cambiata: ricorreggo il problema")
+        problem_fixed = repair_problem(domain_fixed).content.strip()
+        if speculative_running:
+            try:
+                problem_future.result()
+            except Exception:
+                logging.exception("Errore nella correzione speculativa del problema")
 
     print("\n🧙‍♂️ Dominio PDDL corretto:\n", domain_fixed)
     print("\n📜 Problema PDDL corretto:\n", problem_fixed)
 
-    domain_fixed = re.sub(r"```[a-z]*\n?", "", domain_fixed).strip()
-    problem_fixed = re.sub(r"```[a-z]*\n?", "", problem_fixed).strip()
+    domain_fixed = strip_fences(domain_fixed)
+    problem_fixed = strip_fences(problem_fixed)
 
-    with open("domain.pddl", "w") as f:
-        f.write(domain_fixed)
-    with open("problem.pddl", "w") as f:
-        f.write(problem_fixed)
+    workspace.write("domain.pddl", domain_fixed)
+    workspace.write("problem.pddl", problem_fixed)
 
     return domain_fixed, problem_fixed, False
-   
-
-# Rendering
-def render_pddl_action(action: PDDLAction) -> str:
-    return f"""(:action {action.name}
-    :parameters ({' '.join(action.parameters)})
-    :precondition (and {' '.join(action.preconditions)})
-    :effect (and {' '.join(action.effects)})
-)"""
-
-def render_pddl_domain(domain: PDDLDomain) -> str:
-    requirements_str = " ".join(f":{r}" for r in domain.requirements)
-    types_str = " ".join(domain.types)
-    predicates_str = "\n    ".join(domain.predicates)
-    actions_str = "\n".join(render_pddl_action(a) for a in domain.actions)
-
-    return f"""(define (domain {domain.domain_name})
-(:requirements {requirements_str})
-(:types {types_str})
-(:predicates
-    {predicates_str})
-{actions_str}
-)
-"""
-
-def render_pddl_problem(problem: PDDLProblem) -> str:
-    objects_str = "\n    ".join(f"{name} - {type_}" for name, type_ in problem.objects.items())
-    init_str = "\n    ".join(problem.init)
-    goal_str = " ".join(problem.goal)
- 
-    return f"""(define (problem {problem.problem_name})
-(:domain {problem.domain_name})
-(:objects
-    {objects_str})
-(:init
-    {init_str})
-(:goal
-    (and {goal_str}))
-)
-"""
-
-
-# Fast Downward runner
-def run_fast_downward(domain_file: str, problem_file: str) -> Tuple[bool, str, str]:
-    cmd = ["./downward/fast-downward.py", domain_file, problem_file, "--search", "astar(lmcut())"]
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        print("Fast Downward Output:", result.stdout)
-        if os.path.exists("sas_plan"):
-            with open("sas_plan") as f: print("✅ Piano trovato:\n", f.read())
-            return True, result.stdout, result.stderr
-        print("❌ Nessun piano trovato.")
-        return False, result.stdout, result.stderr
-    except subprocess.CalledProcessError as e:
-
-        print("STDERR:\n", e.stdout)
-        return False, e.stdout, e.stderr
-    
-
-narrative_input = lore_text.strip()
-
-
-def saveGraphToJson(file_path="story.txt", output_file="langgraph_adventure.json"):
-    try:
-        graph = loadGraph(file_path)
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(graph, f, indent=4, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error saving graph: {e}")
 
 
 
-def loadGraph(file_path="story.txt"):
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            story = file.read().strip()
-        
-        if not story:
-            raise ValueError("Story file is empty or invalid.")
-
-        node_pattern = re.compile(r'^(\d+)\s*(.*?)(?=^\d+\s*|\Z)', re.DOTALL | re.MULTILINE)
-        nodes = node_pattern.findall(story)
-
-        graph = {}
-        edges = defaultdict(list)
-
-        for node_number, node_content in nodes:
-            node_number = node_number.strip()
-            if not node_number.isdigit():
-                raise ValueError(f"Invalid node number: {node_number}")
-
-            node_content = node_content.strip()
-            choice_split_pattern = re.compile(r'\n\s*→\s*')
-            parts = choice_split_pattern.split(node_content)
-            description = parts[0].strip() if parts else ""
-            choices = parts[1:] if len(parts) > 1 else []
-
-            choice_pattern = re.compile(r'(.+?)\s*\[go to (\d+(?:\s*[✅❌])?)\]', re.DOTALL)
-            outgoing = []
-            for choice in choices:
-                match = choice_pattern.search(choice.strip())
-                if match:
-                    text, target = match.groups()
-                    outgoing.append({"text": text.strip(), "target": target.strip()})
-
-            graph[node_number] = {
-                "description": description,
-                "options": outgoing
-            }
-
-
-        langgraph_nodes = {}
-        for node_id, node in graph.items():
-            langgraph_node_id = f"node_{node_id}"
-            langgraph_nodes[langgraph_node_id] = {
-                "description": node["description"],
-                "options": {
-                    f"option_{i}": {
-                        "text": opt["text"],
-                        "target": f"node_{opt['target']}"
-                    }
-                    for i, opt in enumerate(node["options"])
-                }
-            }
-
-            if '❌' in node["description"] or '✅' in node["description"]:
-                langgraph_nodes[langgraph_node_id]["options"] = {}
-
-        saveGraphToJson()
-
-        return langgraph_nodes
-
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Story file '{file_path}' not found.")
-    except Exception as e:
-        raise ValueError(f"Error parsing story file: {str(e)}")
+# Aggiorna lo stadio del job (se la pipeline gira come job asincrono)
+def report_stage(state: PlanningState, stage: str):
+    jobs.set_stage(state.get("job_id"), stage)
 
 def start_node(state: PlanningState):
     if not state.get("lore_text"):
@@ -743,7 +695,7 @@ def start_node(state: PlanningState):
 
 """def generate_story_node(state: PlanningState):
     print("Generate Story")
-    #response = llm.invoke(generate_story_prompt.format_messages(lore=state["lore_text"]))
+    #response = get_llm().invoke(generate_story_prompt.format_messages(lore=state["lore_text"]))
     #story = response.content.strip()
     with open("story.txt", "r", encoding="utf-8") as file:
         story = file.read().strip()
@@ -752,21 +704,72 @@ def start_node(state: PlanningState):
         f.write(story)
     return state"""
 
+# La storia arriva in streaming: ogni nodo completo viene pubblicato come evento del job
+STREAM_STORY = os.getenv("QUESTMASTER_STREAM_STORY", "1") == "1"
+
+def publish_story_nodes(state: PlanningState, nodes: Dict[str, dict]):
+    for node_id, node in nodes.items():
+        jobs.add_event(state.get("job_id"), "story_node", node_id=node_id, node=node)
+
+# "fanout": scaletta e poi narrativa dei nodi in parallelo; "single": un'unica chiamata
+STORY_MODE = os.getenv("QUESTMASTER_STORY_MODE", "fanout")
+STORY_WORKERS = int(os.getenv("QUESTMASTER_STORY_WORKERS", "8"))
+
+def generate_story_fanout(state: PlanningState) -> str:
+    lore = state["lore_text"]
+    usage = state.get("token_usage")
+    response = get_llm().invoke(story_outline_prompt.format_messages(lore=lore), usage=usage, stage="generate_story")
+    state["workspace"].write("story_outline.json", response.content.strip())
+    outline = parse_outline(response.content)
+    summary = outline_summary(outline)
+
+    def write_node(node: OutlineNode) -> NodeSection:
+        reply = get_llm().invoke(story_node_prompt.format_messages(
+            lore=lore, outline=summary, node=node.model_dump_json(), node_id=node.id
+        ), usage=usage, stage="generate_story")
+        try:
+            return NodeSection(**parse_json_object(reply.content))
+        except (json.JSONDecodeError, ValidationError, TypeError):
+            # Risposta non in JSON: il testo diventa la descrizione del nodo
+            return NodeSection(prerequisites="", narrative=reply.content.strip())
+
+    return generate_sections(outline, write_node, max_workers=STORY_WORKERS,
+                             on_node=lambda text: publish_story_nodes(state, parse_story(text)))
+
+def generate_story_single(state: PlanningState) -> str:
+    messages = generate_story_prompt.format_messages(lore=state["lore_text"])
+    usage = state.get("token_usage")
+    if not STREAM_STORY:
+        return get_llm().invoke(messages, usage=usage, stage="generate_story").content.strip()
+    parser = StoryStreamParser()
+    for chunk in get_llm().stream(messages, usage=usage, stage="generate_story"):
+        publish_story_nodes(state, parser.feed(chunk))
+    publish_story_nodes(state, parser.finish())
+    return parser.text.strip()
+
 def generate_story_node(state: PlanningState):
     print("Generate Story")
-    response = llm.invoke(generate_story_prompt.format_messages(lore=state["lore_text"]))
-    story = response.content.strip()
+    report_stage(state, "generate_story")
+    story = None
+    if STORY_MODE == "fanout":
+        try:
+            story = generate_story_fanout(state).strip()
+        except (json.JSONDecodeError, ValidationError, ValueError) as e:
+            # Scaletta non valida: nessun nodo è ancora stato pubblicato
+            print(f"⚠️ Scaletta della storia non valida ({e}): uso la generazione in un'unica chiamata")
+    if story is None:
+        story = generate_story_single(state)
     state["story"] = story
-    with open("story.txt", "w") as f:
-        f.write(story)
+    state["workspace"].write("story.txt", story)
     return state
 
 def generate_domain_node(state: PlanningState):
     print("Generate Domain")
-    response = llm.invoke(domain_prompt.format_messages(narrative=state["story"]))
+    report_stage(state, "generate_domain")
+    response = get_llm().invoke(domain_prompt.format_messages(narrative=story_context(state["story"])),
+                          usage=state.get("token_usage"), stage="generate_domain")
     raw = response.content.strip().strip("`")
-    with open("domain_raw.json", "w") as f:
-        f.write(raw)
+    state["workspace"].write("domain_raw.json", raw)
     domain_json = json.loads(raw)
     domain_obj = PDDLDomain(**domain_json)
     domain_str = render_pddl_domain(domain_obj)
@@ -776,28 +779,66 @@ def generate_domain_node(state: PlanningState):
 
 def generate_problem_node(state: PlanningState):
     print("Generate Problem")
-    response = llm.invoke(problem_prompt.format_messages(
-        narrative=state["story"], domain=state["domain_str"], lore=state["lore_text"]
-    ))
+    report_stage(state, "generate_problem")
+    response = get_llm().invoke(problem_prompt.format_messages(
+        narrative=story_context(state["story"]), domain=state["domain_str"], lore=state["lore_text"]
+    ), usage=state.get("token_usage"), stage="generate_problem")
     content = response.content.strip()
     match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', content, re.DOTALL)
     json_str = match.group(1) if match else content
-    with open("problem_raw.json", "w") as f:
-        f.write(json_str)
+    state["workspace"].write("problem_raw.json", json_str)
     problem_json = json.loads(json_str)
     problem_obj = PDDLProblem(**problem_json)
     problem_str = render_pddl_problem(problem_obj)
     state["problem_obj"] = problem_obj
     state["problem_str"] = problem_str
-    with open("domain.pddl", "w") as f:
-        f.write(state["domain_str"])
-    with open("problem.pddl", "w") as f:
-        f.write(state["problem_str"])
+    state["workspace"].write("domain.pddl", state["domain_str"])
+    state["workspace"].write("problem.pddl", state["problem_str"])
     return state
 
+# Planner STRIPS nel processo per i task piccoli ("0" per usare sempre Fast Downward)
+LOCAL_PLANNER = os.getenv("QUESTMASTER_LOCAL_PLANNER", "1") == "1"
+# Il planner gira in un pool di worker persistenti ("0" per lanciarlo nel processo corrente)
+PLANNER_POOL = os.getenv("QUESTMASTER_PLANNER_POOL", "1") == "1"
+
+# I worker del planner partono con l'app (in un thread, senza ritardare l'avvio) e non alla prima richiesta
+@generation_api.record_once
+def warm_planner_pool(state):
+    if PLANNER_POOL:
+        threading.Thread(target=get_planner_service().warm, name="questmaster-planner-warm", daemon=True).start()
+
 def run_planner_node(state: PlanningState):
     print("Run Planner")
-    success, stdout, stderr = run_fast_downward("domain.pddl", "problem.pddl")
+    report_stage(state, "run_planner")
+    # Validazione locale: gli errori evidenti non arrivano al planner
+    workspace = state["workspace"]
+    domain_text, problem_text = workspace.read("domain.pddl"), workspace.read("problem.pddl")
+    diagnostics = validate_pddl(domain_text, problem_text)
+    if has_errors(diagnostics):
+        # Correzione deterministica prima di ricorrere all'LLM
+        fixed = autofix_pddl_text(domain_text, problem_text)
+        if fixed is not None:
+            domain_text, problem_text, fixes = fixed
+            print("🔧 Correzioni automatiche:\n", "\n".join(fixes))
+            workspace.write("domain.pddl", domain_text)
+            workspace.write("problem.pddl", problem_text)
+            state["domain_str"], state["problem_str"] = domain_text, problem_text
+            diagnostics = validate_pddl(domain_text, problem_text)
+    state["diagnostics"] = diagnostics
+    if has_errors(diagnostics):
+        errors = [d for d in diagnostics if d.severity == "error"]
+        print("❌ Validazione PDDL fallita:\n", format_diagnostics(errors))
+        state["plan_success"] = False
+        state["stdout"] = format_diagnostics(errors)
+        state["stderr"] = ""
+        return state
+    result = run_local_planner(domain_text, problem_text, cwd=workspace.root, optimal=PLANNER_OPTIMAL) if LOCAL_PLANNER else None
+    if result is not None:
+        success, stdout, stderr = result
+    elif PLANNER_POOL:
+        success, stdout, stderr = get_planner_service().plan("domain.pddl", "problem.pddl", cwd=workspace.root)
+    else:
+        success, stdout, stderr = run_fast_downward("domain.pddl", "problem.pddl", cwd=workspace.root)
     state["plan_success"] = success
     state["stdout"] = stdout
     state["stderr"] = stderr
@@ -805,68 +846,227 @@ def run_planner_node(state: PlanningState):
 
 def reflect_node(state: PlanningState):
     print("Agent")
-    domain_fixed, problem_fixed, restart = reflectionAgent(error_log=state["stdout"])
+    report_stage(state, "reflect")
+    workspace = state["workspace"]
+    domain_fixed, problem_fixed, restart = reflectionAgent(error_log=state["stdout"], workspace=workspace,
+                                                           usage=state.get("token_usage"))
     if(not restart):
-        with open("domain.pddl", "w") as f:
-            f.write(domain_fixed)
-        with open("problem.pddl", "w") as f:
-            f.write(problem_fixed)
+        workspace.write("domain.pddl", domain_fixed)
+        workspace.write("problem.pddl", problem_fixed)
+    else:
+        state["story"] = workspace.read("story.txt").strip()
     print(restart)
     state["restart_from_domain"] = restart
     return state
 
 
-graph = StateGraph(PlanningState)
-
-# Definizione nodi
-graph.set_entry_point("start")
-graph.add_node("start", start_node)
-graph.add_node("generate_story", generate_story_node)
-graph.add_node("generate_domain", generate_domain_node)
-graph.add_node("generate_problem", generate_problem_node)
-graph.add_node("run_planner", run_planner_node)
-graph.add_node("reflect", reflect_node)
-
-# Definizione transizioni
-graph.add_edge("start", "generate_story")
-graph.add_edge("generate_story", "generate_domain")
-graph.add_edge("generate_domain", "generate_problem")
-graph.add_edge("generate_problem", "run_planner")
-graph.add_conditional_edges("run_planner", lambda s: "reflect" if not s["plan_success"] else END)
-graph.add_conditional_edges(
-    "reflect",
-    lambda s: "generate_domain" if s["restart_from_domain"] else "run_planner"
-)
-
-appG = graph.compile()
+def build_pipeline() -> "Pregel":
+    from langgraph.graph import StateGraph, END
+
+    graph = StateGraph(PlanningState)
+
+    # Definizione nodi
+    graph.set_entry_point("start")
+    graph.add_node("start", start_node)
+    graph.add_node("generate_story", generate_story_node)
+    graph.add_node("generate_domain", generate_domain_node)
+    graph.add_node("generate_problem", generate_problem_node)
+    graph.add_node("run_planner", run_planner_node)
+    graph.add_node("reflect", reflect_node)
+
+    # Definizione transizioni
+    graph.add_edge("start", "generate_story")
+    graph.add_edge("generate_story", "generate_domain")
+    graph.add_edge("generate_domain", "generate_problem")
+    graph.add_edge("generate_problem", "run_planner")
+    graph.add_conditional_edges("run_planner", lambda s: "reflect" if not s["plan_success"] else END)
+    graph.add_conditional_edges(
+        "reflect",
+        lambda s: "generate_domain" if s["restart_from_domain"] else "run_planner"
+    )
+    return graph.compile()
+
+# Il grafo LangGraph si compila alla prima generazione
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline() -> "Pregel":
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = build_pipeline()
+        return _pipeline
+
+def run_pipeline(lore: str, job_id: str = "", workspace: Workspace = Workspace()) -> PlanningState:
+    input_state = PlanningState(lore_text=lore, job_id=job_id, workspace=workspace, token_usage=TokenUsage())
+    final_state = get_pipeline().invoke(input_state)
+    print("✅ Piano completato con successo") if final_state["plan_success"] else print("❌ Nessun piano trovato")
+    totals = final_state["token_usage"].totals()
+    print(f"🔢 Token LLM: {totals['input_tokens']} in, {totals['output_tokens']} out, "
+          f"{totals['calls']} chiamate ({totals['cache_hits']} dalla cache), {totals['latency']}s")
+    return final_state
 
 def main():
-   input_state = PlanningState(lore_text=lore_text)
-   final_state = appG.invoke(input_state)
-   print("✅ Piano completato con successo") if final_state["plan_success"] else print("❌ Nessun piano trovato")
+   try:
+       lore_text = read_lore()
+   except FileNotFoundError as e:
+       print(e)
+       exit(1)
+   run_pipeline(lore_text)
    comment()
 
-@app.route('/getGraph', methods=['GET'])
-def get_graph():
+# Commento dei file PDDL: fase opzionale dopo la pubblicazione della storia
+# ("background", "sync" oppure "off")
+COMMENT_MODE = os.getenv("QUESTMASTER_COMMENT", "background")
+comment_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="questmaster-comment")
+
+# Pubblica la storia generata come storia corrente servita da /getGraph
+PUBLISHED_FILES = ("story.txt", "domain.pddl", "problem.pddl", "sas_plan", STATE_GRAPH_FILE)
+COMMENTED_FILES = ("commented_domain.pddl", "commented_problem.pddl")
+# Derivati dalla storia: se il job non li ha prodotti (piano non trovato, grafo degli stati fallito
+# o disattivato) la copia pubblicata è della storia precedente e va rimossa, prima di pubblicare
+DERIVED_FILES = ("sas_plan", STATE_GRAPH_FILE)
+
+# Un job alla volta: i file pubblicati (storia, PDDL, piano, grafo) vengono tutti dallo stesso job
+_publish_lock = threading.Lock()
+
+def publish_files(workspace: Workspace, names):
+    with _publish_lock:
+        for name in names:
+            if name in DERIVED_FILES and not workspace.exists(name):
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    pass
+        for name in names:
+            if workspace.exists(name):
+                workspace.publish(name, name)
+
+def run_comment_stage(workspace: Workspace, job_id: str = ""):
+    jobs.add_event(job_id, "comment_started")
     try:
-        graph = loadGraph()
-        return jsonify(graph), 200
+        comment(workspace)
+        publish_files(workspace, COMMENTED_FILES)
+        jobs.add_event(job_id, "comment_done")
     except Exception as e:
-        logging.exception("Errore nel caricamento del grafo")
-        return jsonify({"success": False, "error": str(e)}), 500
+        logging.exception("Errore nel commento dei file PDDL")
+        jobs.add_event(job_id, "comment_failed", error=str(e))
 
-@app.route('/genStory', methods=['GET'])
+# Grafo degli stati raggiungibili, precalcolato per le lookup a tempo di gioco
+STATE_GRAPH = os.getenv("QUESTMASTER_STATE_GRAPH", "1") == "1"
+
+def run_state_graph_stage(workspace: Workspace, job_id: str = ""):
+    try:
+        # Stesso grounding del planner locale: sezioni che non interpreta renderebbero il grafo sbagliato
+        check_sections(workspace.read("domain.pddl"), workspace.read("problem.pddl"))
+        domain = parse_pddl_domain(workspace.read("domain.pddl"))
+        problem = parse_pddl_problem(workspace.read("problem.pddl"))
+        graph = build_state_graph(domain, problem)
+        write_state_graph(graph, workspace.path(STATE_GRAPH_FILE))
+        if graph.truncated:
+            print(f"⚠️ Grafo degli stati troncato a {len(graph.states)} stati (QUESTMASTER_STATE_GRAPH_MAX_STATES)")
+        issues = verify_story(graph, workspace.read("story.txt")) if workspace.exists("story.txt") else []
+        for issue in issues:
+            print("⚠️ Storia e PDDL non coerenti:", issue)
+        jobs.add_event(job_id, "state_graph_built", states=len(graph.states), truncated=graph.truncated, story_issues=issues)
+    except Exception as e:
+        logging.exception("Errore nel calcolo del grafo degli stati")
+        jobs.add_event(job_id, "state_graph_failed", error=str(e))
+
+def run_generation_job(job):
+    workspace = Workspace.create(prefix=f"job-{job.id}-")
+
+    # Alla rimozione del job si libera anche il grafo in cache letto da /jobs/<id>/graph
+    def cleanup():
+        evict_graph_cache(workspace.path("story.txt"))
+        workspace.cleanup()
+    job.cleanup = cleanup
+    final_state = run_pipeline(read_lore(), job_id=job.id, workspace=workspace)
+    if STATE_GRAPH and final_state["plan_success"]:
+        jobs.set_stage(job.id, "state_graph")
+        run_state_graph_stage(workspace, job.id)
+    publish_files(workspace, PUBLISHED_FILES)
+    if COMMENT_MODE == "sync":
+        jobs.set_stage(job.id, "comment")
+        run_comment_stage(workspace, job.id)
+    elif COMMENT_MODE == "background":
+        comment_executor.submit(run_comment_stage, workspace, job.id)
+    return {
+        "plan_success": final_state["plan_success"],
+        "story_file": workspace.path("story.txt"),
+        "token_usage": final_state["token_usage"].totals(),
+    }
+
+@generation_api.route('/genStory', methods=['GET'])
 def generate_story():
     try:
-        main() 
-        return jsonify({"success": True, "message": "Storia generata"}), 200
+        job = jobs.submit(run_generation_job)
+        return jsonify({"success": True, "message": "Generazione avviata", "job_id": job.id}), 202
     except Exception as e:
         logging.exception("Errore nella generazione della storia")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@generation_api.route('/llmCache/stats', methods=['GET'])
+def llm_cache_stats():
+    # Prima della prima generazione il client non esiste ancora: niente da riportare
+    return jsonify(_llm.stats() if _llm is not None else {}), 200
+
+@generation_api.route('/planCache/stats', methods=['GET'])
+def plan_cache_stats():
+    plan_cache = get_plan_cache()
+    return jsonify(plan_cache.stats() if plan_cache else {}), 200
+
+@generation_api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job non trovato"}), 404
+    since = request.args.get("since", default=0, type=int)
+    return jsonify(job.to_dict(since=since)), 200
+
+# Server-Sent Events: stadi, nodi della storia ed esito del job appena disponibili
+@generation_api.route('/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job non trovato"}), 404
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    since = last_event_id + 1 if last_event_id is not None else request.args.get("since", default=0, type=int)
+
+    def events(since):
+        while True:
+            new_events = jobs.wait_events(job, since)
+            for event in new_events:
+                yield f"id: {event['seq']}\nevent: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            since += len(new_events)
+            if job.done and since >= len(job.events):
+                return
+            if not new_events:
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(events(since)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@generation_api.route('/jobs/<job_id>/graph', methods=['GET'])
+def get_job_graph(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": "Job non trovato"}), 404
+    if job.status != "succeeded":
+        return jsonify({"success": False, "status": job.status, "error": job.error}), 409
+    try:
+        return graph_response(load_graph_payload(job.result["story_file"]))
+    except Exception as e:
+        logging.exception("Errore nel caricamento del grafo")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 
+# Server di sviluppo; in produzione: gunicorn -c gunicorn.conf.py (vedi wsgi.py)
 if __name__ == '__main__':
-    app.run(host = 'localhost', port = 8080, debug = True)
+    create_app(generation=generation_api).run(host = 'localhost', port = 8080, debug = True)
 
 
 """if __name__ == "__main__":
@@ -0,0 +1,51 @@
+import os
+import statistics
+import subprocess
+import sys
+
+
+# Benchmark dell'avvio: ogni misura è un interprete nuovo, che importa il modulo e crea l'app
+# come farebbe un worker di gunicorn; riporta anche i moduli pesanti finiti in sys.modules
+HEAVY_MODULES = ("pydantic", "langchain_core", "langchain_openai", "langchain_ollama", "langgraph", "openai", "QuestMaster")
+
+CASES = {
+    "read replica": "import wsgi; app = wsgi.create_app('read')",
+    "all (graph + generation)": "import wsgi; app = wsgi.create_app('all')",
+    "import QuestMaster": "import QuestMaster",
+    "first /getGraph (read)": "import wsgi; wsgi.create_app('read').test_client().get('/getGraph')",
+    # Riferimento: quanto costerebbero le dipendenze caricate subito
+    "langchain_openai + langgraph": "import langchain_openai, langgraph.graph",
+}
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def measure(code: str, repeat: int) -> tuple:
+    times, loaded = [], ""
+    env = dict(os.environ, OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "bench"))
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(code=code, heavy=HEAVY_MODULES)],
+                             capture_output=True, text=True, env=env, check=True).stdout.split()
+        times.append(float(out[0]))
+        loaded = out[1] if len(out) > 1 else ""
+    return min(times), statistics.median(times), loaded
+
+
+def main():
+    repeat = 3 if "--quick" in sys.argv else 10
+    print(f"{'case':<30} {'best ms':>8} {'median ms':>10}  heavy modules loaded")
+    for name, code in CASES.items():
+        best, median, loaded = measure(code, repeat)
+        print(f"{name:<30} {best * 1000:8.1f} {median * 1000:10.1f}  {loaded or '-'}")
+        if name.startswith("read") and loaded:
+            print("⚠️ Il percorso di sola lettura importa moduli della generazione")
+
+
+if __name__ == "__main__":
+    main()
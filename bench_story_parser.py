@@ -0,0 +1,86 @@
+import re
+import sys
+import time
+
+from story_parser import iter_story_nodes, story_graph
+
+
+# Benchmark del parser di story.txt: storie sintetiche sempre più grandi, ottenute replicando
+# i nodi di story.txt con nuovi numeri; confronta il parser riga per riga con la vecchia
+# pipeline a espressioni regolari (copiata qui come riferimento)
+legacy_node_pattern = re.compile(r'^(\d+)\s*(.*?)(?=^\d+\s*|\Z)', re.DOTALL | re.MULTILINE)
+legacy_choice_split_pattern = re.compile(r'\n\s*→\s*')
+legacy_choice_pattern = re.compile(r'(.+?)\s*\[go to (\d+(?:\s*[✅❌])?)\]', re.DOTALL)
+go_to_pattern = re.compile(r'\[go to (\d+)')
+header_pattern = re.compile(r'^(\d+)(?=[ \t]*[✅❌]?[ \t]*$)', re.MULTILINE)
+
+
+def legacy_parse(story: str) -> dict:
+    graph = {}
+    for number, content in legacy_node_pattern.findall(story.strip()):
+        parts = legacy_choice_split_pattern.split(content.strip())
+        options = {}
+        for i, choice in enumerate(parts[1:]):
+            match = legacy_choice_pattern.search(choice.strip())
+            if match:
+                options[f"option_{i}"] = {"text": match.group(1).strip(), "target": f"node_{match.group(2).strip()}"}
+        description = parts[0].strip()
+        graph[f"node_{number}"] = {
+            "description": description,
+            "options": {} if "❌" in description or "✅" in description else options,
+        }
+    return graph
+
+
+def synthetic_story(base: str, size: int) -> str:
+    nodes = [n for n in re.split(r'(?m)^(?=\d+[ \t]*[✅❌]?[ \t]*$)', base.strip()) if n.strip()]
+    count = len(nodes)
+    parts, length, copy = [], 0, 0
+    while length < size:
+        offset = copy * count
+        for node in nodes:
+            node = header_pattern.sub(lambda m: str(int(m.group(1)) + offset), node, count=1)
+            node = go_to_pattern.sub(lambda m: f"[go to {int(m.group(1)) + offset}", node)
+            parts.append(node)
+            length += len(node)
+        copy += 1
+    return "\n".join(parts)
+
+
+def timed(fn, story: str, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(story)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    with open("story.txt", encoding="utf-8") as f:
+        base = f.read()
+    sizes = [int(mb * 1024 * 1024) for mb in (0.25, 1, 4, 16)]
+    if "--quick" in sys.argv:
+        sizes = sizes[:2]
+    new = lambda story: story_graph(iter_story_nodes(story.splitlines()))
+    print(f"{'size':>8} {'nodes':>7} {'regex s':>9} {'regex MB/s':>11} {'lines s':>9} {'lines MB/s':>11}")
+    for size in sizes:
+        story = synthetic_story(base, size)
+        mb = len(story.encode("utf-8")) / (1024 * 1024)
+        graph = new(story)
+        if legacy_parse(story) != graph:
+            print("⚠️ I due parser producono grafi diversi")
+        old_t, new_t = timed(legacy_parse, story), timed(new, story)
+        print(f"{mb:7.2f}M {len(graph):7d} {old_t:9.3f} {mb / old_t:11.1f} {new_t:9.3f} {mb / new_t:11.1f}")
+
+    # Caso patologico: una scelta senza destinazione seguita da testo; la regex della vecchia
+    # pipeline riprova da ogni posizione (tempo quadratico), il parser a righe resta lineare
+    prefix = synthetic_story(base, 64 * 1024)
+    for lines in (100, 200, 400):
+        story = prefix + "\n→ *Wait*\n" + "filler line without a target\n" * lines
+        print(f"choice without target + {lines} lines: regex {timed(legacy_parse, story, 1):.3f}s, "
+              f"lines {timed(new, story, 1):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
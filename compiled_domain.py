@@ -0,0 +1,163 @@
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from pddl_models import PDDLDomain
+from pddl_text import PDDLSyntaxError, parse_sexp, parse_typed_list
+
+
+# Dominio "compilato" per simulare le partite: indice delle azioni per nome,
+# precondizioni ed effetti già analizzati con la posizione dei parametri
+Fact = Tuple[str, ...]
+
+
+@lru_cache(maxsize=65536)
+def parse_fact(text: str) -> Fact:
+    exprs = parse_sexp(text)
+    if len(exprs) != 1 or not isinstance(exprs[0], list) or not exprs[0] or any(isinstance(a, list) for a in exprs[0]):
+        raise ValueError(f"Not a ground atom: {text}")
+    return tuple(str(a) for a in exprs[0])
+
+
+@lru_cache(maxsize=65536)
+def fact_text(fact: Fact) -> str:
+    return f"({' '.join(fact)})"
+
+
+def normalize_action_name(name: str) -> str:
+    return name.strip().lower().replace("_", "-")
+
+
+# Letterale dello schema: predicato e, per ogni argomento, indice del parametro o costante
+class Template(NamedTuple):
+    predicate: str
+    slots: Tuple[object, ...]
+
+    def ground(self, args: Tuple[str, ...]) -> Fact:
+        return (self.predicate,) + tuple(args[s] if isinstance(s, int) else s for s in self.slots)
+
+
+class GroundStep(NamedTuple):
+    name: str
+    args: Tuple[str, ...]
+    pre_pos: FrozenSet[Fact]
+    pre_neg: FrozenSet[Fact]
+    add: FrozenSet[Fact]
+    delete: FrozenSet[Fact]
+
+
+class CompiledAction(NamedTuple):
+    name: str
+    parameters: Tuple[str, ...]
+    types: Tuple[str, ...]
+    pre_pos: Tuple[Template, ...]
+    pre_neg: Tuple[Template, ...]
+    add: Tuple[Template, ...]
+    delete: Tuple[Template, ...]
+
+    def ground(self, args: Tuple[str, ...]) -> GroundStep:
+        if len(args) != len(self.parameters):
+            raise ValueError(f"Action {self.name} expects {len(self.parameters)} argument(s), got {len(args)}")
+        add = frozenset(t.ground(args) for t in self.add)
+        return GroundStep(
+            self.name, args,
+            frozenset(t.ground(args) for t in self.pre_pos),
+            frozenset(t.ground(args) for t in self.pre_neg),
+            add,
+            # Come in Fast Downward: prima si tolgono i fatti, poi si aggiungono
+            frozenset(t.ground(args) for t in self.delete) - add,
+        )
+
+
+def _templates(items: List[str], parameters: Tuple[str, ...], where: str) -> Tuple[List[Template], List[Template]]:
+    positive, negative = [], []
+
+    def visit(expr):
+        if not isinstance(expr, list) or not expr:
+            return
+        if expr[0] == "and":
+            for sub in expr[1:]:
+                visit(sub)
+            return
+        target = positive
+        if expr[0] == "not" and len(expr) == 2 and isinstance(expr[1], list):
+            expr, target = expr[1], negative
+        if not expr or any(isinstance(a, list) for a in expr) or expr[0] in ("or", "imply", "when", "forall", "exists"):
+            print(f"⚠️ Formula non supportata in {where}: ignorata")
+            return
+        target.append(Template(str(expr[0]), tuple(parameters.index(a) if a in parameters else str(a) for a in expr[1:])))
+
+    for item in items:
+        try:
+            for expr in parse_sexp(item):
+                visit(expr)
+        except PDDLSyntaxError as e:
+            print(f"⚠️ Letterale non valido in {where}: {e}")
+    return positive, negative
+
+
+def compile_action(action) -> CompiledAction:
+    typed = parse_typed_list(" ".join(action.parameters).lower().split())
+    parameters = tuple(name for name, _ in typed)
+    pre_pos, pre_neg = _templates(action.preconditions, parameters, f"precondition of {action.name}")
+    add, delete = _templates(action.effects, parameters, f"effect of {action.name}")
+    return CompiledAction(
+        normalize_action_name(action.name), parameters, tuple(t for _, t in typed),
+        tuple(pre_pos), tuple(pre_neg), tuple(add), tuple(delete),
+    )
+
+
+class CompiledDomain:
+    def __init__(self, domain: PDDLDomain):
+        self.domain = domain
+        self.actions: Dict[str, CompiledAction] = {}
+        for action in domain.actions:
+            compiled = compile_action(action)
+            self.actions.setdefault(compiled.name, compiled)
+        # Azioni ground già incontrate, per nome del passo del piano
+        self._steps: Dict[str, GroundStep] = {}
+
+    def action(self, name: str) -> Optional[CompiledAction]:
+        return self.actions.get(normalize_action_name(name))
+
+    # "(move hero a b)" -> GroundStep; KeyError se l'azione non è nel dominio
+    def step(self, text: str) -> GroundStep:
+        step = self._steps.get(text)
+        if step is None:
+            name, *args = text.strip().strip("()").lower().split()
+            action = self.action(name)
+            if action is None:
+                raise KeyError(name)
+            step = self._steps[text] = action.ground(tuple(args))
+        return step
+
+    def is_applicable(self, step: GroundStep, facts: FrozenSet[Fact]) -> bool:
+        return step.pre_pos <= facts and facts.isdisjoint(step.pre_neg)
+
+    def apply(self, step: GroundStep, facts: FrozenSet[Fact]) -> FrozenSet[Fact]:
+        return (facts - step.delete) | step.add
+
+
+@lru_cache(maxsize=65536)
+def _init_fact(text: str) -> Optional[Fact]:
+    exprs = parse_sexp(text)
+    # Mondo chiuso: i letterali negativi non aggiungono nulla allo stato
+    if len(exprs) == 1 and isinstance(exprs[0], list) and exprs[0] and exprs[0][0] == "not":
+        return None
+    return parse_fact(text)
+
+
+def facts_from_text(items: Iterable[str]) -> FrozenSet[Fact]:
+    return frozenset(f for f in map(_init_fact, items) if f is not None)
+
+
+# Domini compilati per oggetto PDDLDomain (pochi: uno per partita)
+_compiled: Dict[int, CompiledDomain] = {}
+
+
+def compile_domain(domain: PDDLDomain) -> CompiledDomain:
+    compiled = _compiled.get(id(domain))
+    if compiled is None or compiled.domain is not domain:
+        if len(_compiled) >= 64:
+            _compiled.clear()
+        compiled = _compiled[id(domain)] = CompiledDomain(domain)
+    return compiled
@@ -0,0 +1,85 @@
+import logging
+from typing import Optional
+
+from flask import Blueprint, Response, jsonify, request
+
+from state_graph import load_state_graph
+from story_graph import GraphPayload, load_graph_node, load_graph_payload, load_graph_skeleton
+
+
+# Route di sola lettura sul grafo pubblicato: servite da tutte le istanze, anche dalle repliche
+# che non generano storie (QUESTMASTER_ROLE=read)
+graph_api = Blueprint("graph", __name__)
+
+
+# ETag forte per rappresentazione: identity, gzip e br sono corpi diversi e hanno tag diversi
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    return f"{etag}-{encoding}" if encoding else etag
+
+
+# Grafo già serializzato e compresso; con If-None-Match uguale a uno degli ETag si risponde 304 senza corpo
+def graph_response(payload: GraphPayload) -> Response:
+    encoding = next((e for e in ("br", "gzip") if e in payload.encoded and request.accept_encodings[e]), None)
+    variants = [encoded_etag(payload.etag, e) for e in (None, *payload.encoded)]
+    if any(request.if_none_match.contains_weak(tag) for tag in variants):
+        response = Response(status=304)
+    else:
+        response = Response(payload.encoded[encoding] if encoding else payload.body, mimetype="application/json")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(encoded_etag(payload.etag, encoding))
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@graph_api.route('/getGraph', methods=['GET'])
+def get_graph():
+    try:
+        return graph_response(load_graph_payload())
+    except Exception as e:
+        logging.exception("Errore nel caricamento del grafo")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# Caricamento progressivo per il GameComponent: struttura senza descrizioni e nodi singoli
+@graph_api.route('/getGraphSkeleton', methods=['GET'])
+def get_graph_skeleton():
+    try:
+        return graph_response(load_graph_skeleton())
+    except FileNotFoundError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except Exception as e:
+        logging.exception("Errore nel caricamento del grafo")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@graph_api.route('/graphNode/<node_id>', methods=['GET'])
+def get_graph_node(node_id):
+    successors = request.args.get("successors", default=0, type=int) == 1
+    try:
+        return graph_response(load_graph_node(node_id, successors))
+    except KeyError:
+        return jsonify({"success": False, "error": "Nodo non trovato"}), 404
+    except FileNotFoundError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except Exception as e:
+        logging.exception("Errore nel caricamento del grafo")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@graph_api.route('/getStateGraph', methods=['GET'])
+def get_state_graph():
+    try:
+        return jsonify(load_state_graph().to_dict()), 200
+    except FileNotFoundError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    except Exception as e:
+        logging.exception("Errore nel caricamento del grafo degli stati")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@graph_api.route('/stateGraph/<int:state_id>', methods=['GET'])
+def get_state_graph_node(state_id):
+    try:
+        graph = load_state_graph()
+    except FileNotFoundError as e:
+        return jsonify({"success": False, "error": str(e)}), 404
+    if not 0 <= state_id < len(graph.states):
+        return jsonify({"success": False, "error": "Stato non trovato"}), 404
+    return jsonify(graph.node(state_id)), 200
@@ -0,0 +1,33 @@
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+
+# Configurazione di gunicorn per il server di produzione: gunicorn -c gunicorn.conf.py
+# I job di generazione vivono in memoria nel processo che li ha avviati: con il ruolo "all"
+# si usa un solo processo con più thread; le repliche "read" scalano a più processi
+load_dotenv()
+role = os.getenv("QUESTMASTER_ROLE", "all")
+
+wsgi_app = "wsgi:create_app()"
+bind = os.getenv("QUESTMASTER_BIND", "0.0.0.0:8080")
+
+# Thread per processo: le letture del grafo restano servite mentre una generazione
+# o uno stream SSE occupano altri thread
+worker_class = "gthread"
+workers = int(os.getenv("QUESTMASTER_WORKERS", "1" if role == "all" else str(multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.getenv("QUESTMASTER_THREADS", "16" if role == "all" else "4"))
+
+# Con gthread il timeout riguarda il processo bloccato, non la durata delle richieste (SSE compresi)
+timeout = int(os.getenv("QUESTMASTER_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("QUESTMASTER_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("QUESTMASTER_KEEPALIVE", "5"))
+
+# Riciclo periodico dei processi solo per le repliche: nel ruolo "all" interromperebbe i job
+if role == "read":
+    max_requests = int(os.getenv("QUESTMASTER_MAX_REQUESTS", "10000"))
+    max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv("QUESTMASTER_ACCESS_LOG", "-")
+errorlog = "-"
@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+
+# Stadi della pipeline riportati nello stato del job
+STAGES = ("generate_story", "generate_domain", "generate_problem", "run_planner", "reflect", "state_graph", "comment")
+
+MAX_WORKERS = int(os.getenv("QUESTMASTER_JOB_WORKERS", "4"))
+MAX_FINISHED_JOBS = int(os.getenv("QUESTMASTER_MAX_FINISHED_JOBS", "100"))
+
+
+class Job:
+    def __init__(self, job_id: str):
+        self.id = job_id
+        self.status = "queued"
+        self.stage: Optional[str] = None
+        self.events: List[dict] = []
+        self.error: Optional[str] = None
+        self.result: Optional[dict] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cleanup: Optional[Callable[[], None]] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self, since: int = 0) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "events": self.events[since:],
+            "next_event": len(self.events),
+        }
+
+
+class JobManager:
+    def __init__(self, max_workers: int = MAX_WORKERS, max_finished: int = MAX_FINISHED_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="questmaster-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        # Notifica i client in streaming quando arrivano nuovi eventi
+        self._changed = threading.Condition(self._lock)
+        self._max_finished = max_finished
+
+    def submit(self, fn: Callable[[Job], dict]) -> Job:
+        job = Job(uuid.uuid4().hex)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._emit(job, "queued")
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def set_stage(self, job_id: Optional[str], stage: str, message: str = ""):
+        job = self.get(job_id) if job_id else None
+        if job is None:
+            return
+        job.stage = stage
+        self._emit(job, "stage", stage=stage, message=message)
+
+    def add_event(self, job_id: Optional[str], event: str, **data):
+        job = self.get(job_id) if job_id else None
+        if job is not None:
+            self._emit(job, event, **data)
+
+    # Eventi a partire da "since", aspettando fino a timeout se non ce ne sono di nuovi
+    def wait_events(self, job: Job, since: int = 0, timeout: float = 15.0) -> List[dict]:
+        with self._changed:
+            self._changed.wait_for(lambda: len(job.events) > since or job.done, timeout=timeout)
+            return job.events[since:]
+
+    def _run(self, job: Job, fn: Callable[[Job], dict]):
+        job.status = "running"
+        job.started_at = time.time()
+        self._emit(job, "started")
+        try:
+            result, status, error = fn(job), "succeeded", None
+        except Exception as e:
+            logging.exception("Errore nel job %s", job.id)
+            result, status, error = None, "failed", str(e)
+        # Stato finale ed evento terminale insieme: chi vede job.done trova già l'evento
+        with self._changed:
+            job.result, job.error = result, error
+            job.finished_at = time.time()
+            job.status = status
+            self._append(job, status, error=error)
+
+    def _emit(self, job: Job, event: str, **data):
+        with self._changed:
+            self._append(job, event, **data)
+
+    # Da chiamare con il lock preso
+    def _append(self, job: Job, event: str, **data):
+        job.events.append({"seq": len(job.events), "time": time.time(), "event": event, **data})
+        self._changed.notify_all()
+
+    # Rimuove i job terminati più vecchi oltre il limite
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if j.done]
+        if len(finished) <= self._max_finished:
+            return
+        finished.sort(key=lambda j: j.finished_at or 0)
+        for job in finished[:len(finished) - self._max_finished]:
+            del self._jobs[job.id]
+            if job.cleanup:
+                job.cleanup()
+
+
+jobs = JobManager()
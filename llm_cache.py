@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Iterator, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+from token_usage import TokenUsage
+
+
+LLM_CACHE = os.getenv("QUESTMASTER_LLM_CACHE", "sqlite")
+LLM_CACHE_PATH = os.getenv("QUESTMASTER_LLM_CACHE_PATH", "llm_cache.sqlite")
+LLM_CACHE_TTL = float(os.getenv("QUESTMASTER_LLM_CACHE_TTL", "0")) or None
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("QUESTMASTER_LLM_CACHE_MAX_ENTRIES", "1000"))
+# Stadi mai serviti dalla cache: una correzione che non risolve l'errore tornerebbe identica
+# al giro successivo (stessi input), e il ciclo di reflect non farebbe progressi
+LLM_CACHE_SKIP_STAGES = frozenset(s.strip() for s in os.getenv("QUESTMASTER_LLM_CACHE_SKIP_STAGES", "reflect").split(",") if s.strip())
+
+
+# Chiave: modello, temperatura e messaggi già formattati
+def cache_key(model: str, temperature, messages: List[BaseMessage]) -> str:
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "messages": [{"type": m.type, "content": m.content} for m in messages],
+    }
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str):
+        ...
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def stats(self) -> dict:
+        return {"backend": type(self).__name__, "hits": self.hits, "misses": self.misses}
+
+
+# Cache LRU in memoria
+class MemoryCache(ResponseCache):
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1]):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        self._count(entry is not None)
+        return entry[0] if entry else None
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "entries": len(self._entries)}
+
+
+# Cache persistente su SQLite (condivisa tra processi e riavvii)
+class SQLiteCache(ResponseCache):
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: Optional[float] = None, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        value = None
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self._expired(row[1]):
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            elif row is not None:
+                value = row[0]
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._count(value is not None)
+        return value
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return {**super().stats(), "entries": entries}
+
+
+def make_cache(backend: str = LLM_CACHE) -> Optional[ResponseCache]:
+    if backend == "sqlite":
+        return SQLiteCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL)
+    if backend == "memory":
+        return MemoryCache(ttl=LLM_CACHE_TTL)
+    return None
+
+
+# Wrapper del modello: stessa interfaccia invoke(), con risposte riusate dalla cache;
+# con usage=TokenUsage() ogni chiamata viene registrata con lo stadio indicato
+class CachedLLM:
+    def __init__(self, llm, cache: Optional[ResponseCache] = None, skip_stages: frozenset = LLM_CACHE_SKIP_STAGES):
+        self.llm = llm
+        self.cache = cache
+        self.skip_stages = skip_stages
+        self.model = getattr(llm, "model_name", None) or getattr(llm, "model", "")
+        self.temperature = getattr(llm, "temperature", None)
+
+    def invoke(self, messages: List[BaseMessage], usage: Optional[TokenUsage] = None, stage: str = "", **kwargs) -> AIMessage:
+        start = time.perf_counter()
+        key = self._key(messages, stage)
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            response = AIMessage(content=cached)
+        else:
+            response = self.llm.invoke(messages, **kwargs)
+            if key is not None:
+                self.cache.set(key, response.content)
+        if usage is not None:
+            usage.record(stage, messages, response.content, getattr(response, "usage_metadata", None),
+                         time.perf_counter() - start, cache_hit=cached is not None)
+        return response
+
+    # Streaming: restituisce i pezzi di testo man mano che arrivano; la risposta completa va in cache
+    def stream(self, messages: List[BaseMessage], usage: Optional[TokenUsage] = None, stage: str = "", **kwargs) -> Iterator[str]:
+        start = time.perf_counter()
+        key = self._key(messages, stage)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                if usage is not None:
+                    usage.record(stage, messages, cached, None, time.perf_counter() - start, cache_hit=True)
+                yield cached
+                return
+        parts = []
+        metadata = None
+        for chunk in self.llm.stream(messages, **kwargs):
+            text = chunk.content if isinstance(chunk.content, str) else ""
+            if text:
+                parts.append(text)
+                yield text
+            # L'uso dei token arriva nell'ultimo chunk (stream_usage=True)
+            if getattr(chunk, "usage_metadata", None):
+                metadata = chunk.usage_metadata
+        if key is not None:
+            self.cache.set(key, "".join(parts))
+        if usage is not None:
+            usage.record(stage, messages, "".join(parts), metadata, time.perf_counter() - start)
+
+    def _key(self, messages: List[BaseMessage], stage: str) -> Optional[str]:
+        if self.cache is None or stage in self.skip_stages:
+            return None
+        return cache_key(self.model, self.temperature, messages)
+
+    def stats(self) -> dict:
+        return self.cache.stats() if self.cache else {"backend": None}
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
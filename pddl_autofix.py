@@ -0,0 +1,203 @@
+from typing import Dict, List, Optional, Tuple
+
+from pddl_models import PDDLDomain, PDDLProblem, parse_pddl_domain, parse_pddl_problem, render_pddl_domain, render_pddl_problem
+from pddl_text import PDDLSyntaxError, parse_sexp, parse_typed_list, strip_fences, to_text
+from pddl_validator import has_errors, validate_pddl
+from strips_planner import check_sections
+
+
+# Correzioni deterministiche degli errori più comuni nel PDDL generato dall'LLM,
+# tentate prima di chiedere una correzione all'LLM
+LOGICAL_OPERATORS = {"and", "or", "not", "imply", "when", "forall", "exists"}
+
+
+def _parse_literal(text: str):
+    try:
+        exprs = parse_sexp(text)
+    except PDDLSyntaxError:
+        return None
+    return exprs[0] if len(exprs) == 1 and isinstance(exprs[0], list) else None
+
+
+# Rimuove i separatori di tipo "- type" finiti dentro un letterale
+def _strip_type_separators(expr, fixes: List[str]):
+    if not isinstance(expr, list) or not expr:
+        return expr
+    if expr[0] in LOGICAL_OPERATORS:
+        return [expr[0]] + [_strip_type_separators(e, fixes) for e in expr[1:]]
+    if "-" not in expr[1:]:
+        return expr
+    cleaned, i = [expr[0]], 1
+    while i < len(expr):
+        if expr[i] == "-" and i + 1 < len(expr):
+            i += 2
+            continue
+        cleaned.append(expr[i])
+        i += 1
+    fixes.append(f"removed type separator from literal {to_text(expr)}")
+    return cleaned
+
+
+def _literals(expr):
+    if not isinstance(expr, list) or not expr:
+        return
+    if expr[0] in LOGICAL_OPERATORS:
+        for sub in expr[1:]:
+            if isinstance(sub, list):
+                yield from _literals(sub)
+        return
+    yield expr
+
+
+def _clean_literals(items: List[str], fixes: List[str]) -> List[str]:
+    cleaned = []
+    for item in items:
+        expr = _parse_literal(item)
+        cleaned.append(to_text(_strip_type_separators(expr, fixes)) if expr is not None else item)
+    return cleaned
+
+
+def _declared_types(domain: PDDLDomain) -> Dict[str, str]:
+    return {name: parent for name, parent in parse_typed_list(domain.types)}
+
+
+def _declared_predicates(domain: PDDLDomain) -> Dict[str, List[str]]:
+    predicates = {}
+    for decl in domain.predicates:
+        expr = _parse_literal(decl)
+        if expr:
+            predicates.setdefault(expr[0], [t for _, t in parse_typed_list(expr[1:])])
+    return predicates
+
+
+def _declare_predicate(domain: PDDLDomain, predicates: Dict[str, List[str]], name: str, arg_types: List[str], fixes: List[str]):
+    params = " ".join(f"?a{i} - {t}" for i, t in enumerate(arg_types))
+    decl = f"({name} {params})" if params else f"({name})"
+    domain.predicates.append(decl)
+    predicates[name] = list(arg_types)
+    fixes.append(f"declared missing predicate {decl}")
+
+
+def _declare_type(domain: PDDLDomain, types: Dict[str, str], type_: str, fixes: List[str]):
+    if type_ == "object" or type_ in types or not types:
+        return
+    domain.types.append(type_)
+    types[type_] = "object"
+    fixes.append(f"declared missing type {type_}")
+
+
+def autofix_domain(domain: PDDLDomain) -> Tuple[PDDLDomain, List[str]]:
+    domain = domain.model_copy(deep=True)
+    fixes: List[str] = []
+
+    seen, predicates_decl = set(), []
+    for decl in domain.predicates:
+        expr = _parse_literal(decl)
+        name = expr[0] if expr else decl
+        if name in seen:
+            fixes.append(f"removed duplicate predicate {decl}")
+            continue
+        seen.add(name)
+        predicates_decl.append(decl)
+    domain.predicates = predicates_decl
+
+    types = _declared_types(domain)
+    predicates = _declared_predicates(domain)
+    for type_list in predicates.values():
+        for type_ in type_list:
+            _declare_type(domain, types, type_, fixes)
+
+    for action in domain.actions:
+        action.preconditions = _clean_literals(action.preconditions, fixes)
+        action.effects = _clean_literals(action.effects, fixes)
+        variables = dict(parse_typed_list(" ".join(action.parameters).split()))
+        for type_ in variables.values():
+            _declare_type(domain, types, type_, fixes)
+        for item in action.preconditions + action.effects:
+            for literal in _literals(_parse_literal(item)):
+                if literal[0] == "=" or literal[0] in predicates:
+                    continue
+                _declare_predicate(domain, predicates, literal[0], [variables.get(a, "object") for a in literal[1:]], fixes)
+        if any(item.startswith("(not") for item in action.preconditions) and "negative-preconditions" not in domain.requirements:
+            domain.requirements.append("negative-preconditions")
+            fixes.append("added :negative-preconditions requirement")
+
+    return domain, fixes
+
+
+def autofix_problem(problem: PDDLProblem, domain: PDDLDomain) -> Tuple[PDDLProblem, PDDLDomain, List[str]]:
+    problem = problem.model_copy(deep=True)
+    domain = domain.model_copy(deep=True)
+    fixes: List[str] = []
+    types = _declared_types(domain)
+    predicates = _declared_predicates(domain)
+
+    if problem.domain_name != domain.domain_name:
+        fixes.append(f"set problem domain name to {domain.domain_name}")
+        problem.domain_name = domain.domain_name
+
+    for type_ in problem.objects.values():
+        _declare_type(domain, types, type_, fixes)
+
+    # Mondo chiuso: i letterali negativi in :init sono superflui
+    init = []
+    for fact in _clean_literals(problem.init, fixes):
+        if fact.startswith("(not"):
+            fixes.append(f"dropped negative init literal {fact}")
+            continue
+        if fact in init:
+            fixes.append(f"removed duplicate init fact {fact}")
+            continue
+        init.append(fact)
+    problem.init = init
+    problem.goal = _clean_literals(problem.goal, fixes)
+
+    for item in problem.init + problem.goal:
+        for literal in _literals(_parse_literal(item)):
+            name, args = literal[0], literal[1:]
+            expected = predicates.get(name)
+            for i, arg in enumerate(args):
+                if isinstance(arg, list) or arg in problem.objects:
+                    continue
+                type_ = expected[i] if expected and i < len(expected) else "object"
+                problem.objects[arg] = type_
+                fixes.append(f"declared missing object {arg} - {type_}")
+            if name != "=" and expected is None:
+                _declare_predicate(domain, predicates, name, [problem.objects.get(a, "object") for a in args], fixes)
+
+    return problem, domain, fixes
+
+
+def autofix(domain: PDDLDomain, problem: PDDLProblem) -> Tuple[PDDLDomain, PDDLProblem, List[str]]:
+    domain, domain_fixes = autofix_domain(domain)
+    problem, domain, problem_fixes = autofix_problem(problem, domain)
+    return domain, problem, domain_fixes + problem_fixes
+
+
+# Prova a correggere il testo PDDL; restituisce None se restano errori
+def autofix_pddl_text(domain_text: str, problem_text: str) -> Optional[Tuple[str, str, List[str]]]:
+    fixes: List[str] = []
+    if strip_fences(domain_text) != domain_text.strip() or strip_fences(problem_text) != problem_text.strip():
+        fixes.append("stripped Markdown code fences")
+    try:
+        # La correzione ripassa dai modelli: sezioni che non rappresentano (:derived, :functions,
+        # :durative-action, ...) sparirebbero dal testo riscritto
+        check_sections(domain_text, problem_text)
+        domain = parse_pddl_domain(domain_text)
+        problem = parse_pddl_problem(problem_text)
+    except (PDDLSyntaxError, ValueError):
+        return None
+
+    # I duplicati in :objects vengono già fusi dal parsing
+    fixes.extend(
+        f"removed duplicate object ({d.message})"
+        for d in validate_pddl(domain_text, problem_text) if d.code == "duplicate-object"
+    )
+    domain, problem, rule_fixes = autofix(domain, problem)
+    fixes.extend(rule_fixes)
+
+    domain_fixed = render_pddl_domain(domain)
+    problem_fixed = render_pddl_problem(problem)
+    if has_errors(validate_pddl(domain_fixed, problem_fixed)):
+        return None
+    return domain_fixed, problem_fixed, fixes
@@ -0,0 +1,123 @@
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+from pddl_text import find_define, parse_typed_list, strip_fences, to_text
+
+
+# Pydantic models
+class PDDLAction(BaseModel):
+    name: str
+    parameters: List[str]
+    preconditions: List[str]
+    effects: List[str]
+
+class PDDLDomain(BaseModel):
+    domain_name: str
+    requirements: List[str]
+    types: List[str]
+    predicates: List[str]
+    actions: List[PDDLAction]
+
+class PDDLProblem(BaseModel):
+    problem_name: str
+    domain_name: str
+    objects: Dict[str,str]
+    init: List[str]
+    goal: List[str]
+
+
+# Rendering
+def render_pddl_action(action: PDDLAction) -> str:
+    return f"""(:action {action.name}
+    :parameters ({' '.join(action.parameters)})
+    :precondition (and {' '.join(action.preconditions)})
+    :effect (and {' '.join(action.effects)})
+)"""
+
+def render_pddl_domain(domain: PDDLDomain) -> str:
+    requirements_str = " ".join(f":{r}" for r in domain.requirements)
+    types_str = " ".join(domain.types)
+    predicates_str = "\n    ".join(domain.predicates)
+    actions_str = "\n".join(render_pddl_action(a) for a in domain.actions)
+
+    return f"""(define (domain {domain.domain_name})
+(:requirements {requirements_str})
+(:types {types_str})
+(:predicates
+    {predicates_str})
+{actions_str}
+)
+"""
+
+def render_pddl_problem(problem: PDDLProblem) -> str:
+    objects_str = "\n    ".join(f"{name} - {type_}" for name, type_ in problem.objects.items())
+    init_str = "\n    ".join(problem.init)
+    goal_str = " ".join(problem.goal)
+ 
+    return f"""(define (problem {problem.problem_name})
+(:domain {problem.domain_name})
+(:objects
+    {objects_str})
+(:init
+    {init_str})
+(:goal
+    (and {goal_str}))
+)
+"""
+
+
+# Parsing del testo PDDL nei modelli (il contrario del rendering)
+def _conjuncts(expr) -> List[str]:
+    if isinstance(expr, list) and expr and expr[0] == "and":
+        return [to_text(e) for e in expr[1:]]
+    if isinstance(expr, list) and not expr:
+        return []
+    return [to_text(expr)]
+
+def parse_pddl_domain(text: str) -> PDDLDomain:
+    define = find_define(strip_fences(text))
+    domain = PDDLDomain(domain_name="", requirements=[], types=[], predicates=[], actions=[])
+    for expr in define[1:]:
+        if not isinstance(expr, list) or not expr:
+            continue
+        head = expr[0]
+        if head == "domain" and len(expr) > 1:
+            domain.domain_name = expr[1]
+        elif head == ":requirements":
+            domain.requirements = [r.lstrip(":") for r in expr[1:]]
+        elif head == ":types":
+            domain.types = [to_text(t) for t in expr[1:]]
+        elif head == ":predicates":
+            domain.predicates = [to_text(p) for p in expr[1:]]
+        elif head == ":constants":
+            raise ValueError("Domain constants are not supported by PDDLDomain")
+        elif head == ":action":
+            fields = dict(zip(expr[2::2], expr[3::2]))
+            domain.actions.append(PDDLAction(
+                name=expr[1],
+                parameters=[f"{var} - {type_}" for var, type_ in parse_typed_list(fields.get(":parameters", []))],
+                preconditions=_conjuncts(fields.get(":precondition", [])),
+                effects=_conjuncts(fields.get(":effect", [])),
+            ))
+    return domain
+
+def parse_pddl_problem(text: str) -> PDDLProblem:
+    define = find_define(strip_fences(text))
+    problem = PDDLProblem(problem_name="", domain_name="", objects={}, init=[], goal=[])
+    for expr in define[1:]:
+        if not isinstance(expr, list) or not expr:
+            continue
+        head = expr[0]
+        if head == "problem" and len(expr) > 1:
+            problem.problem_name = expr[1]
+        elif head == ":domain" and len(expr) > 1:
+            problem.domain_name = expr[1]
+        elif head == ":objects":
+            for name, type_ in parse_typed_list(expr[1:]):
+                problem.objects.setdefault(name, type_)
+        elif head == ":init":
+            problem.init = [to_text(f) for f in expr[1:]]
+        elif head == ":goal" and len(expr) > 1:
+            problem.goal = _conjuncts(expr[1])
+    return problem
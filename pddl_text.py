@@ -0,0 +1,136 @@
+import re
+from typing import List, NamedTuple, Tuple, Union
+
+
+# Parser minimale di testo PDDL (s-expression)
+SExp = Union[str, list]
+
+token_pattern = re.compile(r'\(|\)|[^\s()]+')
+
+
+class Token(NamedTuple):
+    value: str
+    line: int
+
+
+def strip_comments(text: str) -> str:
+    return re.sub(r';[^\n]*', '', text)
+
+
+def strip_fences(text: str) -> str:
+    return re.sub(r"```[a-z]*\n?", "", text).strip()
+
+
+def tokenize(text: str) -> List[Token]:
+    tokens = []
+    for line_no, line in enumerate(strip_comments(text).split("\n"), start=1):
+        tokens.extend(Token(t.lower(), line_no) for t in token_pattern.findall(line))
+    return tokens
+
+
+# Atomi e liste ricordano la riga di origine (per la diagnostica)
+class Atom(str):
+    line: int = 0
+
+
+class SList(list):
+    line: int = 0
+
+
+class PDDLSyntaxError(ValueError):
+    def __init__(self, message: str, line: int = 0):
+        super().__init__(message)
+        self.line = line
+
+
+def parse_sexp(text: str) -> list:
+    stack: List[list] = [SList()]
+    for token in tokenize(text):
+        if token.value == "(":
+            expr = SList()
+            expr.line = token.line
+            stack.append(expr)
+        elif token.value == ")":
+            if len(stack) == 1:
+                raise PDDLSyntaxError(f"Unbalanced ')' at line {token.line}", token.line)
+            closed = stack.pop()
+            stack[-1].append(closed)
+        else:
+            atom = Atom(token.value)
+            atom.line = token.line
+            stack[-1].append(atom)
+    if len(stack) != 1:
+        line = stack[-1].line
+        raise PDDLSyntaxError(f"{len(stack) - 1} unclosed '(' (innermost opened at line {line})", line)
+    return stack[0]
+
+
+def to_text(expr: SExp) -> str:
+    if isinstance(expr, list):
+        return "(" + " ".join(to_text(e) for e in expr) + ")"
+    return str(expr)
+
+
+def find_define(text: str) -> list:
+    for expr in parse_sexp(text):
+        if isinstance(expr, list) and expr and expr[0] == "define":
+            return expr
+    raise PDDLSyntaxError("Missing (define ...) block")
+
+
+def sections(define: list) -> dict:
+    result = {}
+    for expr in define[1:]:
+        if isinstance(expr, list) and expr and isinstance(expr[0], str):
+            if expr[0].startswith(":"):
+                result.setdefault(expr[0], []).append(expr[1:])
+            else:
+                result[expr[0]] = [expr[1:]]
+    return result
+
+
+# "?a ?b - t1 ?c" -> [("?a", "t1"), ("?b", "t1"), ("?c", "object")]
+def parse_typed_list(items: List[SExp]) -> List[Tuple[str, str]]:
+    result, pending = [], []
+    i = 0
+    while i < len(items):
+        item = items[i]
+        if item == "-" and i + 1 < len(items):
+            type_ = items[i + 1]
+            if isinstance(type_, list):
+                type_ = " ".join(str(t) for t in type_)
+            result.extend((name, type_) for name in pending)
+            pending = []
+            i += 2
+            continue
+        if isinstance(item, str):
+            pending.append(item)
+        i += 1
+    result.extend((name, "object") for name in pending)
+    return result
+
+
+class DomainSignature(NamedTuple):
+    types: frozenset
+    predicates: frozenset
+    constants: frozenset
+
+
+def domain_signature(text: str) -> DomainSignature:
+    secs = sections(find_define(strip_fences(text)))
+    types = frozenset(t for body in secs.get(":types", []) for t in parse_typed_list(body))
+    predicates = frozenset(
+        (pred[0], tuple(type_ for _, type_ in parse_typed_list(pred[1:])))
+        for body in secs.get(":predicates", []) for pred in body
+        if isinstance(pred, list) and pred
+    )
+    constants = frozenset(c for body in secs.get(":constants", []) for c in parse_typed_list(body))
+    return DomainSignature(types, predicates, constants)
+
+
+# True se tipi, predicati e costanti dei due domini coincidono
+def same_domain_structure(domain_a: str, domain_b: str) -> bool:
+    try:
+        return domain_signature(domain_a) == domain_signature(domain_b)
+    except ValueError:
+        return False
@@ -0,0 +1,246 @@
+from typing import Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from pddl_models import PDDLDomain, PDDLProblem, render_pddl_domain, render_pddl_problem
+from pddl_text import PDDLSyntaxError, find_define, parse_typed_list, strip_fences
+
+
+# Validazione locale di dominio e problema PDDL, prima di avviare il planner
+class PDDLDiagnostic(BaseModel):
+    severity: str  # "error" | "warning"
+    code: str
+    message: str
+    file: str  # "domain" | "problem"
+    line: Optional[int] = None
+
+
+class DomainInfo(BaseModel):
+    name: str = ""
+    types: Dict[str, str] = {}
+    predicates: Dict[str, List[str]] = {}
+    constants: Dict[str, str] = {}
+
+
+LOGICAL_OPERATORS = {"and", "or", "not", "imply", "when"}
+QUANTIFIERS = {"forall", "exists"}
+
+
+class _Checker:
+    def __init__(self, file: str):
+        self.file = file
+        self.diagnostics: List[PDDLDiagnostic] = []
+
+    def error(self, code: str, message: str, node=None):
+        self.diagnostics.append(PDDLDiagnostic(severity="error", code=code, message=message, file=self.file, line=getattr(node, "line", None) or None))
+
+    def warning(self, code: str, message: str, node=None):
+        self.diagnostics.append(PDDLDiagnostic(severity="warning", code=code, message=message, file=self.file, line=getattr(node, "line", None) or None))
+
+    def check_type(self, type_: str, info: DomainInfo, node=None):
+        if type_ != "object" and info.types and type_ not in info.types:
+            self.error("undeclared-type", f"Type '{type_}' is not declared in :types", node)
+
+    # Controlla ricorsivamente una formula (precondizione, effetto, init o goal)
+    def check_formula(self, expr, info: DomainInfo, variables: Dict[str, str], objects: Dict[str, str], where: str):
+        if not isinstance(expr, list):
+            self.error("bad-formula", f"Expected a formula in {where}, got '{expr}'", expr)
+            return
+        if not expr:
+            return
+        head = expr[0]
+        if isinstance(head, list):
+            self.error("bad-formula", f"Unexpected nested list in {where}", expr)
+            return
+        if head in LOGICAL_OPERATORS:
+            for sub in expr[1:]:
+                self.check_formula(sub, info, variables, objects, where)
+            return
+        if head in QUANTIFIERS and len(expr) == 3 and isinstance(expr[1], list):
+            scoped = dict(variables)
+            for name, type_ in parse_typed_list(expr[1]):
+                self.check_type(type_, info, expr)
+                scoped[name] = type_
+            self.check_formula(expr[2], info, scoped, objects, where)
+            return
+        self.check_literal(expr, info, variables, objects, where)
+
+    def check_literal(self, expr: list, info: DomainInfo, variables: Dict[str, str], objects: Dict[str, str], where: str):
+        head, args = expr[0], expr[1:]
+        if "-" in args:
+            self.error("type-in-literal", f"Type separator '-' inside literal ({' '.join(map(str, expr))}) in {where}", expr)
+            return
+        if head != "=" and head not in info.predicates:
+            self.error("undeclared-predicate", f"Predicate '{head}' used in {where} is not declared", expr)
+        elif head != "=" and len(args) != len(info.predicates[head]):
+            self.error(
+                "arity-mismatch",
+                f"Predicate '{head}' expects {len(info.predicates[head])} argument(s), got {len(args)} in {where}",
+                expr,
+            )
+        for i, arg in enumerate(args):
+            if isinstance(arg, list):
+                self.error("bad-formula", f"Nested term in literal '{head}' in {where}", expr)
+                continue
+            if arg.startswith("?"):
+                if arg not in variables:
+                    self.error("unbound-variable", f"Variable '{arg}' in {where} is not bound to a parameter", expr)
+                    continue
+                arg_type = variables[arg]
+            elif arg in objects:
+                arg_type = objects[arg]
+            elif arg in info.constants:
+                arg_type = info.constants[arg]
+            else:
+                self.error("undefined-object", f"Undefined object '{arg}' in {where}", expr)
+                continue
+            if head in info.predicates and i < len(info.predicates[head]):
+                expected = info.predicates[head][i]
+                if not is_subtype(arg_type, expected, info.types):
+                    self.warning(
+                        "type-mismatch",
+                        f"Argument '{arg}' of '{head}' has type '{arg_type}', expected '{expected}' in {where}",
+                        expr,
+                    )
+
+
+def is_subtype(type_: str, expected: str, types: Dict[str, str]) -> bool:
+    seen: Set[str] = set()
+    while type_ not in seen:
+        if type_ == expected or expected == "object":
+            return True
+        seen.add(type_)
+        type_ = types.get(type_, "object")
+    return False
+
+
+def _parse(text: str, checker: _Checker):
+    try:
+        return find_define(strip_fences(text))
+    except PDDLSyntaxError as e:
+        checker.error("syntax", str(e), e)
+        return None
+
+
+def validate_domain_text(text: str) -> Tuple[List[PDDLDiagnostic], Optional[DomainInfo]]:
+    checker = _Checker("domain")
+    define = _parse(text, checker)
+    if define is None:
+        return checker.diagnostics, None
+
+    info = DomainInfo()
+    actions = []
+    for expr in define[1:]:
+        if not isinstance(expr, list) or not expr:
+            continue
+        head = expr[0]
+        if head == "domain" and len(expr) > 1:
+            info.name = expr[1]
+        elif head == ":types":
+            for name, parent in parse_typed_list(expr[1:]):
+                info.types[name] = parent
+        elif head == ":constants":
+            for name, type_ in parse_typed_list(expr[1:]):
+                if name in info.constants:
+                    checker.error("duplicate-object", f"Constant '{name}' declared twice", expr)
+                info.constants[name] = type_
+        elif head == ":predicates":
+            for pred in expr[1:]:
+                if not isinstance(pred, list) or not pred or isinstance(pred[0], list):
+                    checker.error("bad-predicate", "Malformed predicate declaration", expr)
+                    continue
+                if pred[0] in info.predicates:
+                    checker.warning("duplicate-predicate", f"Predicate '{pred[0]}' declared twice", pred)
+                info.predicates[pred[0]] = [type_ for _, type_ in parse_typed_list(pred[1:])]
+        elif head == ":action":
+            actions.append(expr)
+
+    for parent in set(info.types.values()):
+        checker.check_type(parent, info)
+    for types in info.predicates.values():
+        for type_ in types:
+            checker.check_type(type_, info)
+    for type_ in info.constants.values():
+        checker.check_type(type_, info)
+
+    for action in actions:
+        name = action[1] if len(action) > 1 else "?"
+        fields = dict(zip(action[2::2], action[3::2]))
+        variables = {}
+        for var, type_ in parse_typed_list(fields.get(":parameters", [])):
+            if not var.startswith("?"):
+                checker.error("bad-parameter", f"Parameter '{var}' of action '{name}' must start with '?'", action)
+            checker.check_type(type_, info, action)
+            variables[var] = type_
+        for field in (":precondition", ":effect"):
+            if field in fields:
+                checker.check_formula(fields[field], info, variables, {}, f"{field[1:]} of action '{name}'")
+
+    return checker.diagnostics, info
+
+
+def validate_problem_text(text: str, info: DomainInfo) -> List[PDDLDiagnostic]:
+    checker = _Checker("problem")
+    define = _parse(text, checker)
+    if define is None:
+        return checker.diagnostics
+
+    objects: Dict[str, str] = {}
+    init, goal = [], None
+    for expr in define[1:]:
+        if not isinstance(expr, list) or not expr:
+            continue
+        head = expr[0]
+        if head == ":domain" and len(expr) > 1 and info.name and expr[1] != info.name:
+            checker.error("domain-mismatch", f"Problem refers to domain '{expr[1]}', domain is '{info.name}'", expr)
+        elif head == ":objects":
+            for name, type_ in parse_typed_list(expr[1:]):
+                if name in objects or name in info.constants:
+                    checker.error("duplicate-object", f"Object '{name}' declared twice", name)
+                checker.check_type(type_, info, name)
+                objects[name] = type_
+        elif head == ":init":
+            init = expr[1:]
+        elif head == ":goal":
+            goal = expr[1] if len(expr) > 1 else None
+
+    for fact in init:
+        if isinstance(fact, list) and fact and fact[0] == "not":
+            checker.warning("negative-init", "Negative literal in :init is redundant under the closed-world assumption", fact)
+            continue
+        if isinstance(fact, list) and fact and fact[0] in LOGICAL_OPERATORS | QUANTIFIERS:
+            checker.error("bad-init", f"Only ground atoms are allowed in :init, got '{fact[0]}'", fact)
+            continue
+        checker.check_formula(fact, info, {}, objects, "init")
+
+    if goal is None:
+        checker.error("missing-goal", "Problem has no :goal")
+    else:
+        checker.check_formula(goal, info, {}, objects, "goal")
+
+    return checker.diagnostics
+
+
+def validate_pddl(domain_text: str, problem_text: str) -> List[PDDLDiagnostic]:
+    diagnostics, info = validate_domain_text(domain_text)
+    if info is None:
+        return diagnostics
+    return diagnostics + validate_problem_text(problem_text, info)
+
+
+def validate_models(domain: PDDLDomain, problem: PDDLProblem) -> List[PDDLDiagnostic]:
+    return validate_pddl(render_pddl_domain(domain), render_pddl_problem(problem))
+
+
+def has_errors(diagnostics: List[PDDLDiagnostic]) -> bool:
+    return any(d.severity == "error" for d in diagnostics)
+
+
+# Testo compatto da passare al prompt di correzione al posto del log del planner;
+# l'intestazione di fallimento solo se c'è almeno un errore
+def format_diagnostics(diagnostics: List[PDDLDiagnostic]) -> str:
+    lines = ["PDDL validation failed:"] if has_errors(diagnostics) else []
+    for d in diagnostics:
+        location = f"{d.file}.pddl" + (f":{d.line}" if d.line else "")
+        lines.append(f"{d.severity.upper()} [{d.code}] {location}: {d.message}")
+    return "\n".join(lines)
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from pddl_text import PDDLSyntaxError, parse_sexp, parse_typed_list, strip_comments, strip_fences, to_text
+
+
+PLAN_CACHE_PATH = os.getenv("QUESTMASTER_PLAN_CACHE", "plan_cache.sqlite")
+
+UNSOLVABLE_MARKER = "search stopped without finding a solution."
+# Versione della forma canonica, parte delle chiavi: cambiandola si ignorano le voci
+# (piani e file .sas) salvate con una canonicalizzazione precedente
+CANONICAL_VERSION = "2"
+
+
+class PlanResult(NamedTuple):
+    success: bool
+    plan: str
+    stdout: str
+    stderr: str
+
+
+# Forma canonica: ordine di fatti, oggetti, predicati e azioni non conta;
+# l'ordine dei parametri di un'azione sì (gli argomenti del piano sono posizionali)
+def _sorted_texts(items) -> list:
+    return sorted(items, key=to_text)
+
+
+def _canonical_typed(items) -> list:
+    return [f"{name} - {type_}" for name, type_ in sorted(parse_typed_list(items))]
+
+
+def _canonical_parameters(items) -> list:
+    return [f"{name} - {type_}" for name, type_ in parse_typed_list(items)]
+
+
+def _canonical_formula(expr):
+    if isinstance(expr, list) and expr and expr[0] == "and":
+        return ["and"] + _sorted_texts(_canonical_formula(e) for e in expr[1:])
+    return expr
+
+
+def _canonical_define(define: list) -> list:
+    result = [define[0]]
+    for expr in define[1:]:
+        if not isinstance(expr, list) or not expr:
+            result.append(expr)
+            continue
+        head = expr[0]
+        if head in (":types", ":objects", ":constants"):
+            result.append([head] + _canonical_typed(expr[1:]))
+        elif head in (":requirements", ":predicates", ":init"):
+            result.append([head] + _sorted_texts(expr[1:]))
+        elif head == ":goal":
+            result.append([head] + [_canonical_formula(e) for e in expr[1:]])
+        elif head == ":action":
+            fields = dict(zip(expr[2::2], expr[3::2]))
+            action = [head, expr[1]]
+            for field in sorted(fields):
+                value = fields[field]
+                action += [field, _canonical_parameters(value) if field == ":parameters" else _canonical_formula(value)]
+            result.append(action)
+        else:
+            result.append(expr)
+    actions = _sorted_texts(e for e in result if isinstance(e, list) and e and e[0] == ":action")
+    return [e for e in result if not (isinstance(e, list) and e and e[0] == ":action")] + actions
+
+
+def canonical_pddl(text: str) -> str:
+    try:
+        exprs = parse_sexp(strip_fences(text))
+    except PDDLSyntaxError:
+        return " ".join(strip_comments(text).lower().split())
+    return " ".join(
+        to_text(_canonical_define(e) if isinstance(e, list) and e and e[0] == "define" else e)
+        for e in exprs
+    )
+
+
+def plan_key(domain_text: str, problem_text: str, config: str = "") -> str:
+    data = "\n".join([CANONICAL_VERSION, config, canonical_pddl(domain_text), canonical_pddl(problem_text)])
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+# Cache dei piani (trovati o dimostrati impossibili) su SQLite
+class PlanCache:
+    def __init__(self, path: str = PLAN_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS plans ("
+                "key TEXT PRIMARY KEY, success INTEGER NOT NULL, plan TEXT NOT NULL, "
+                "stdout TEXT NOT NULL, stderr TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[PlanResult]:
+        with self._lock:
+            row = self._conn.execute("SELECT success, plan, stdout, stderr FROM plans WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return PlanResult(bool(row[0]), row[1], row[2], row[3])
+
+    def set(self, key: str, result: PlanResult):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO plans (key, success, plan, stdout, stderr, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, int(result.success), result.plan, result.stdout, result.stderr, time.time()),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM plans").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+# Si memorizzano solo esiti definitivi: piano trovato o problema irrisolvibile
+def is_cacheable(result: PlanResult) -> bool:
+    return result.success or UNSOLVABLE_MARKER in (result.stdout or "").lower()
+
+
+def make_plan_cache(path: str = PLAN_CACHE_PATH) -> Optional[PlanCache]:
+    if not path or path == "off":
+        return None
+    return PlanCache(path)
@@ -0,0 +1,416 @@
+import contextlib
+import hashlib
+import io
+import os
+import re
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from plan_cache import CANONICAL_VERSION, PlanResult, canonical_pddl, is_cacheable, make_plan_cache, plan_key
+
+
+# Fast Downward runner
+FAST_DOWNWARD = os.getenv("FAST_DOWNWARD", "./downward/fast-downward.py")
+# Binario di ricerca: se presente viene lanciato direttamente sul file .sas, senza il driver Python
+SEARCH_BINARY = os.getenv(
+    "FAST_DOWNWARD_SEARCH",
+    os.path.join(os.path.dirname(FAST_DOWNWARD), "builds", "release", "bin", "downward"),
+)
+# Cartella che contiene il pacchetto fast_downward.translate (Fast Downward >= 24.06): i worker
+# del planner lo importano e traducono nel proprio processo, senza avviare il driver
+TRANSLATOR_PATH = os.getenv("FAST_DOWNWARD_TRANSLATOR", os.path.dirname(SEARCH_BINARY))
+
+# "portfolio": più configurazioni in parallelo, vince il primo piano valido
+# "single": solo A* con lmcut (ottimo), comunque con limiti di tempo e memoria
+PLANNER_MODE = os.getenv("QUESTMASTER_PLANNER", "portfolio")
+PLANNER_OPTIMAL = os.getenv("QUESTMASTER_PLANNER_OPTIMAL", "0") == "1"
+PLANNER_TIME_LIMIT = os.getenv("QUESTMASTER_PLANNER_TIME_LIMIT", "60s")
+PLANNER_MEMORY_LIMIT = os.getenv("QUESTMASTER_PLANNER_MEMORY_LIMIT", "2G")
+
+# Output del translator (SAS+) riusato tra ricerche sullo stesso task
+SAS_CACHE_DIR = os.getenv("QUESTMASTER_SAS_CACHE", "sas_cache")
+SAS_CACHE_MAX_FILES = int(os.getenv("QUESTMASTER_SAS_CACHE_MAX_FILES", "200"))
+
+
+class PlannerConfig(NamedTuple):
+    name: str
+    search: str
+    optimal: bool
+    time_limit: str = PLANNER_TIME_LIMIT
+    memory_limit: str = PLANNER_MEMORY_LIMIT
+
+
+PORTFOLIO = [
+    PlannerConfig("lazy-ff", "lazy_greedy([ff()], preferred=[ff()])", False),
+    PlannerConfig("astar-lmcut", "astar(lmcut())", True),
+    PlannerConfig("eager-cea", "eager_greedy([cea()])", False),
+]
+SINGLE = [PORTFOLIO[1]]
+
+# Codici di uscita del driver che valgono per ogni configurazione:
+# problema irrisolvibile o errore nell'input PDDL
+DECISIVE_EXIT_CODES = {10, 11, 30, 31, 33}
+# Codici di uscita del translator (driver/returncodes.py)
+TRANSLATE_OUT_OF_MEMORY = 20
+TRANSLATE_OUT_OF_TIME = 21
+TRANSLATE_CRITICAL_ERROR = 30
+TRANSLATE_INPUT_ERROR = 31
+
+_plan_cache = None
+_plan_cache_pid = None
+
+
+# Una connessione SQLite per processo (i worker del planner sono processi separati)
+def get_plan_cache():
+    global _plan_cache, _plan_cache_pid
+    if _plan_cache_pid != os.getpid():
+        _plan_cache = make_plan_cache()
+        _plan_cache_pid = os.getpid()
+    return _plan_cache
+
+
+class _Translator(NamedTuple):
+    set_options: Callable[[List[str]], None]
+    main: Callable[[], None]
+    parse_error: type
+
+
+class _TranslateTimeout(Exception):
+    pass
+
+
+_translator: Optional[_Translator] = None
+
+
+# Importa il translator nel processo corrente; False se manca o è di una versione senza
+# fast_downward.translate, e allora translate() continua a usare il driver
+def load_translator(path: str = TRANSLATOR_PATH) -> bool:
+    global _translator
+    if _translator is not None:
+        return True
+    if not os.path.isdir(os.path.join(path, "fast_downward", "translate")):
+        return False
+    sys.path.insert(0, os.path.abspath(path))
+    try:
+        from fast_downward.translate import main, options, pddl_parser
+    except ImportError:
+        sys.path.remove(os.path.abspath(path))
+        return False
+    _translator = _Translator(options.set_options, main.main, pddl_parser.ParseError)
+    return True
+
+
+def parse_time_limit(limit: str) -> float:
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([smh]?)", limit.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid time limit: {limit}")
+    return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+
+
+def parse_memory_limit(limit: str) -> int:
+    match = re.fullmatch(r"(\d+)\s*([kmg]?)", limit.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid memory limit: {limit}")
+    return int(match.group(1)) * {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}[match.group(2)]
+
+
+def fd_command(config: PlannerConfig, sas_file: str, plan_file: str) -> List[str]:
+    if os.path.exists(SEARCH_BINARY):
+        return [os.path.abspath(SEARCH_BINARY), "--search", config.search, "--internal-plan-file", plan_file]
+    return [
+        os.path.abspath(FAST_DOWNWARD),
+        "--overall-time-limit", config.time_limit,
+        "--overall-memory-limit", config.memory_limit,
+        "--plan-file", plan_file,
+        sas_file,
+        "--search", config.search,
+    ]
+
+
+def translate_key(domain_text: str, problem_text: str) -> str:
+    # La versione invalida i .sas tradotti con la vecchia forma canonica (parametri riordinati)
+    data = "\n".join([CANONICAL_VERSION, canonical_pddl(domain_text), canonical_pddl(problem_text)])
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _prune_sas_cache():
+    try:
+        entries = [e for e in os.scandir(SAS_CACHE_DIR) if e.name.endswith(".sas")]
+    except FileNotFoundError:
+        return
+    if len(entries) <= SAS_CACHE_MAX_FILES:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for entry in entries[:len(entries) - SAS_CACHE_MAX_FILES]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def _translate_timeout(signum, frame):
+    raise _TranslateTimeout()
+
+
+# Stessi codici di uscita del translator lanciato dal driver; il limite di tempo usa SIGALRM,
+# quindi solo nel thread principale (quello che esegue i task nei worker del pool), quello di
+# memoria abbassa per la durata della traduzione il limite soft RLIMIT_AS del worker
+def _translate_in_process(domain_path: str, problem_path: str, sas_path: str,
+                          time_limit: str, memory_limit: str) -> Tuple[int, str]:
+    out = io.StringIO()
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    memory = parse_memory_limit(memory_limit)
+    if hard != resource.RLIM_INFINITY:
+        memory = min(memory, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (memory, hard))
+    except (ValueError, OSError):
+        pass
+    previous = signal.signal(signal.SIGALRM, _translate_timeout)
+    signal.setitimer(signal.ITIMER_REAL, parse_time_limit(time_limit))
+    try:
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+            try:
+                _translator.set_options([domain_path, problem_path, "--sas-file", sas_path])
+                _translator.main()
+                code = 0
+            except _translator.parse_error as e:
+                print(e)
+                code = TRANSLATE_INPUT_ERROR
+            except MemoryError:
+                print("Translator ran out of memory")
+                code = TRANSLATE_OUT_OF_MEMORY
+            except _TranslateTimeout:
+                print("Translator hit the time limit")
+                code = TRANSLATE_OUT_OF_TIME
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else TRANSLATE_CRITICAL_ERROR
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+                code = TRANSLATE_CRITICAL_ERROR
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+        except (ValueError, OSError):
+            pass
+    return code, out.getvalue()
+
+
+# Traduzione PDDL -> SAS+ separata dalla ricerca; il file .sas viene riusato se il task non cambia
+def translate(domain_path: str, problem_path: str, key: str, cwd: str = ".", time_limit: str = PLANNER_TIME_LIMIT,
+              memory_limit: str = PLANNER_MEMORY_LIMIT) -> Tuple[Optional[str], str, str]:
+    cached_path = os.path.join(SAS_CACHE_DIR, f"{key}.sas") if SAS_CACHE_DIR != "off" else None
+    if cached_path and os.path.exists(cached_path):
+        os.utime(cached_path)
+        print("♻️ Output del translator dalla cache")
+        return os.path.abspath(cached_path), "", ""
+
+    if cached_path:
+        os.makedirs(SAS_CACHE_DIR, exist_ok=True)
+        sas_path = os.path.abspath(f"{cached_path}.{uuid.uuid4().hex}.tmp")
+    else:
+        sas_path = os.path.abspath(os.path.join(cwd, "output.sas"))
+    if _translator is not None and threading.current_thread() is threading.main_thread():
+        returncode, stdout = _translate_in_process(domain_path, problem_path, sas_path, time_limit, memory_limit)
+        stdout, stderr = stdout + f"translate exit code: {returncode}\n", ""
+    else:
+        cmd = [
+            os.path.abspath(FAST_DOWNWARD),
+            "--overall-time-limit", time_limit,
+            "--overall-memory-limit", memory_limit,
+            "--sas-file", sas_path,
+            "--translate", domain_path, problem_path,
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, cwd=cwd)
+        returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
+    if returncode != 0 or not os.path.exists(sas_path):
+        if cached_path and os.path.exists(sas_path):
+            os.remove(sas_path)
+        return None, stdout, stderr
+
+    if cached_path:
+        os.replace(sas_path, cached_path)
+        _prune_sas_cache()
+        sas_path = os.path.abspath(cached_path)
+    return sas_path, stdout, stderr
+
+
+def _limit_resources(config: PlannerConfig):
+    cpu = int(parse_time_limit(config.time_limit)) + 1
+    memory = parse_memory_limit(config.memory_limit)
+    def apply():
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+        except (ValueError, OSError):
+            pass
+    return apply
+
+
+class _Run:
+    def __init__(self, config: PlannerConfig, run_dir: str, plan_file: str, proc: subprocess.Popen, stdout, stderr):
+        self.config = config
+        self.plan_path = os.path.join(run_dir, plan_file)
+        self.proc = proc
+        self.stdout = stdout
+        self.stderr = stderr
+        # Limite di tempo reale, oltre a quello di CPU, con un piccolo margine
+        self.deadline = time.monotonic() + parse_time_limit(config.time_limit) + 5
+
+    def output(self) -> Tuple[str, str]:
+        self.stdout.seek(0)
+        self.stderr.seek(0)
+        return self.stdout.read(), self.stderr.read()
+
+    def kill(self):
+        if self.proc.poll() is None:
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.proc.wait()
+
+    def close(self):
+        self.stdout.close()
+        self.stderr.close()
+
+
+def _start(config: PlannerConfig, sas_path: str, cwd: str, plan_file: str) -> _Run:
+    # Ogni configurazione ha la sua cartella: output.sas e il piano non si sovrascrivono
+    run_dir = os.path.join(cwd, f"fd-{config.name}")
+    os.makedirs(run_dir, exist_ok=True)
+    if os.path.exists(os.path.join(run_dir, plan_file)):
+        os.remove(os.path.join(run_dir, plan_file))
+    stdout, stderr = tempfile.TemporaryFile(mode="w+"), tempfile.TemporaryFile(mode="w+")
+    cmd = fd_command(config, sas_path, plan_file)
+    if cmd[0] == os.path.abspath(SEARCH_BINARY):
+        with open(sas_path) as sas_input:
+            proc = subprocess.Popen(
+                cmd, cwd=run_dir, stdin=sas_input, stdout=stdout, stderr=stderr, text=True,
+                start_new_session=True, preexec_fn=_limit_resources(config),
+            )
+    else:
+        proc = subprocess.Popen(
+            cmd, cwd=run_dir, stdout=stdout, stderr=stderr, text=True, start_new_session=True,
+        )
+    return _Run(config, run_dir, plan_file, proc, stdout, stderr)
+
+
+def run_portfolio(sas_path: str, cwd: str = ".", plan_file: str = "sas_plan",
+                  configs: List[PlannerConfig] = PORTFOLIO, optimal: bool = False) -> Tuple[bool, str, str]:
+    runs = [_start(config, sas_path, cwd, plan_file) for config in configs]
+
+    pending = list(runs)
+    winner: Optional[_Run] = None
+    fallback: Optional[_Run] = None
+    try:
+        while pending and winner is None:
+            for run in list(pending):
+                code = run.proc.poll()
+                if code is None and time.monotonic() > run.deadline:
+                    run.kill()
+                    code = run.proc.returncode
+                if code is None:
+                    continue
+                pending.remove(run)
+                has_plan = os.path.exists(run.plan_path)
+                if has_plan and (run.config.optimal or not optimal):
+                    winner = run
+                    break
+                if has_plan and fallback is None:
+                    fallback = run
+                if code in DECISIVE_EXIT_CODES:
+                    winner = run
+                    break
+            else:
+                time.sleep(0.02)
+    finally:
+        for run in pending:
+            run.kill()
+
+    try:
+        chosen = winner or fallback
+        if chosen is not None:
+            stdout, stderr = chosen.output()
+            print(f"Fast Downward ({chosen.config.name}) Output:", stdout)
+            if os.path.exists(chosen.plan_path):
+                os.replace(chosen.plan_path, os.path.join(cwd, plan_file))
+                with open(os.path.join(cwd, plan_file)) as f: print("✅ Piano trovato:\n", f.read())
+                return True, stdout, stderr
+            print("❌ Nessun piano trovato.")
+            if os.path.exists(os.path.join(cwd, plan_file)):
+                os.remove(os.path.join(cwd, plan_file))
+            return False, stdout, stderr
+
+        # Nessuna configurazione ha concluso: si riportano tutti i log
+        outputs = [(run.config.name, *run.output()) for run in runs]
+        print("❌ Nessun piano trovato entro i limiti.")
+        return (
+            False,
+            "\n".join(f"=== {name} ===\n{out}" for name, out, _ in outputs),
+            "\n".join(f"=== {name} ===\n{err}" for name, _, err in outputs),
+        )
+    finally:
+        for run in runs:
+            run.close()
+
+
+def run_fast_downward(domain_file: str, problem_file: str, cwd: str = ".", plan_file: str = "sas_plan",
+                      optimal: bool = PLANNER_OPTIMAL, time_limit: Optional[str] = None,
+                      memory_limit: Optional[str] = None) -> Tuple[bool, str, str]:
+    configs = PORTFOLIO if PLANNER_MODE == "portfolio" else SINGLE
+    if optimal:
+        configs = [c for c in configs if c.optimal] or SINGLE
+    configs = [c._replace(time_limit=time_limit or c.time_limit, memory_limit=memory_limit or c.memory_limit) for c in configs]
+    plan_path = os.path.join(cwd, plan_file)
+
+    domain_path = os.path.abspath(os.path.join(cwd, domain_file))
+    problem_path = os.path.abspath(os.path.join(cwd, problem_file))
+    with open(domain_path, encoding="utf-8") as f:
+        domain_text = f.read()
+    with open(problem_path, encoding="utf-8") as f:
+        problem_text = f.read()
+
+    key = None
+    plan_cache = get_plan_cache()
+    if plan_cache is not None:
+        key = plan_key(domain_text, problem_text, ";".join(c.search for c in configs))
+        cached = plan_cache.get(key)
+        if cached is not None:
+            print("♻️ Risultato del planner dalla cache")
+            if cached.success:
+                with open(plan_path, "w") as f:
+                    f.write(cached.plan)
+            elif os.path.exists(plan_path):
+                os.remove(plan_path)
+            return cached.success, cached.stdout, cached.stderr
+
+    sas_path, translate_stdout, translate_stderr = translate(
+        domain_path, problem_path, translate_key(domain_text, problem_text), cwd,
+        time_limit=time_limit or PLANNER_TIME_LIMIT, memory_limit=memory_limit or PLANNER_MEMORY_LIMIT,
+    )
+    if sas_path is None:
+        print("Errore nel translator di Fast Downward:\n", translate_stdout)
+        if os.path.exists(plan_path):
+            os.remove(plan_path)
+        success, stdout, stderr = False, translate_stdout, translate_stderr
+    else:
+        success, stdout, stderr = run_portfolio(sas_path, cwd, plan_file, configs, optimal)
+        stdout, stderr = translate_stdout + stdout, translate_stderr + stderr
+    result = PlanResult(success, "", stdout or "", stderr or "")
+    if key is not None and is_cacheable(result):
+        if success:
+            with open(plan_path) as f:
+                result = result._replace(plan=f.read())
+        plan_cache.set(key, result)
+    return success, stdout, stderr
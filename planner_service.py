@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+import resource
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import planner
+
+
+# Pool di worker del planner: processi già avviati (driver, cache e moduli caricati)
+# a cui le richieste arrivano tramite la coda interna dell'executor
+PLANNER_WORKERS = int(os.getenv(
+    "QUESTMASTER_PLANNER_WORKERS",
+    str(max(1, (os.cpu_count() or 1) // len(planner.PORTFOLIO))),
+))
+
+
+def _context():
+    # forkserver: i worker nascono da un processo pulito con planner già importato
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["planner"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+# Cache dei piani aperta e translator importato una volta per worker; il limite di memoria
+# del driver vale ora per il worker, che traduce nel proprio processo
+def _warm_worker():
+    planner.get_plan_cache()
+    if planner.load_translator():
+        memory = planner.parse_memory_limit(planner.PLANNER_MEMORY_LIMIT)
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (memory, resource.getrlimit(resource.RLIMIT_AS)[1]))
+        except (ValueError, OSError):
+            pass
+
+
+def _plan(domain_file: str, problem_file: str, cwd: str, plan_file: str, optimal: bool,
+          time_limit: Optional[str], memory_limit: Optional[str]) -> Tuple[bool, str, str]:
+    return planner.run_fast_downward(
+        domain_file, problem_file, cwd=cwd, plan_file=plan_file, optimal=optimal,
+        time_limit=time_limit, memory_limit=memory_limit,
+    )
+
+
+def _noop():
+    return os.getpid()
+
+
+class PlannerService:
+    def __init__(self, workers: int = PLANNER_WORKERS):
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=_context(), initializer=_warm_worker)
+
+    def submit(self, domain_file: str, problem_file: str, cwd: str = ".", plan_file: str = "sas_plan",
+               optimal: bool = planner.PLANNER_OPTIMAL, time_limit: Optional[str] = None,
+               memory_limit: Optional[str] = None) -> Future:
+        # I worker hanno una propria cartella corrente: si passa sempre un percorso assoluto
+        return self._executor.submit(
+            _plan, domain_file, problem_file, os.path.abspath(cwd), plan_file, optimal, time_limit, memory_limit,
+        )
+
+    def plan(self, domain_file: str, problem_file: str, cwd: str = ".", plan_file: str = "sas_plan",
+             optimal: bool = planner.PLANNER_OPTIMAL, time_limit: Optional[str] = None,
+             memory_limit: Optional[str] = None) -> Tuple[bool, str, str]:
+        return self.submit(domain_file, problem_file, cwd, plan_file, optimal, time_limit, memory_limit).result()
+
+    # Avvia subito tutti i worker invece di aspettare la prima richiesta
+    def warm(self):
+        for future in [self._executor.submit(_noop) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_service: Optional[PlannerService] = None
+_service_lock = threading.Lock()
+
+
+def get_planner_service() -> PlannerService:
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = PlannerService()
+        return _service
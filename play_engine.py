@@ -0,0 +1,120 @@
+import os
+from typing import List, Optional
+
+from compiled_domain import compile_domain, normalize_action_name, parse_fact
+from pddl_models import PDDLDomain, PDDLProblem, render_pddl_domain, render_pddl_problem
+from pddl_text import PDDLSyntaxError, parse_sexp, to_text
+from planner import run_fast_downward
+from strips_planner import GroundTask, TaskTooLarge, UnsupportedTask, ground, search
+from world_state import FactTable, WorldState
+
+
+# Motore di gioco incrementale: il dominio resta fisso per tutta la partita,
+# il piano si verifica dallo stato corrente e si ricalcola solo se non vale più
+def read_plan(path: str = "sas_plan") -> Optional[List[str]]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith(";")]
+    except FileNotFoundError:
+        return None
+
+
+def _same_step(a: str, b: str) -> bool:
+    return normalize_action_name(a.strip("() ")) == normalize_action_name(b.strip("() "))
+
+
+class PlayEngine:
+    def __init__(self, domain: PDDLDomain, problem: PDDLProblem, plan: Optional[List[str]],
+                 state: WorldState, cwd: str = "."):
+        self.domain = domain
+        self.problem = problem.model_copy(deep=True)
+        self.compiled = compile_domain(domain)
+        self.state = state
+        self.plan = plan
+        self.cwd = cwd
+        self.replans = 0
+        self._task: Optional[GroundTask] = None
+        self._task_index = {}
+        self._goal_pos, self._goal_neg = self._goal_masks(state.table)
+
+    def _goal_masks(self, table: FactTable):
+        positive, negative = [], []
+        try:
+            for item in self.problem.goal:
+                for expr in parse_sexp(item):
+                    if expr and expr[0] == "and":
+                        exprs = expr[1:]
+                    else:
+                        exprs = [expr]
+                    for literal in exprs:
+                        if literal and literal[0] == "not" and len(literal) == 2:
+                            negative.append(parse_fact(to_text(literal[1])))
+                        else:
+                            positive.append(parse_fact(to_text(literal)))
+        except (PDDLSyntaxError, ValueError):
+            # Obiettivo non congiuntivo: non si verifica localmente, decide il planner
+            return None, None
+        return table.mask(positive), table.mask(negative)
+
+    def is_goal(self, state: Optional[WorldState] = None) -> bool:
+        state = self.state if state is None else state
+        if self._goal_pos is None:
+            return False
+        return state.bits & self._goal_pos == self._goal_pos and not state.bits & self._goal_neg
+
+    # Il resto del piano porta ancora all'obiettivo partendo da questo stato?
+    def plan_is_valid(self, plan: Optional[List[str]], state: Optional[WorldState] = None) -> bool:
+        if plan is None:
+            return False
+        state = self.state if state is None else state
+        for text in plan:
+            try:
+                step = self.compiled.step(text)
+            except (KeyError, ValueError):
+                return False
+            if not state.is_applicable(step):
+                return False
+            state = state.apply(step)
+        return self.is_goal(state)
+
+    # Azione eseguita e nuovo stato (calcolato con apply_action_effects); True se si è ripianificato
+    def advance(self, action: str, state: WorldState) -> bool:
+        self.state = state
+        suffix = self.plan[1:] if self.plan and _same_step(self.plan[0], action) else self.plan
+        if self.plan_is_valid(suffix):
+            self.plan = suffix
+            return False
+        print("🔁 Il piano non è più valido: ripianificazione dallo stato corrente")
+        self.plan = self.replan()
+        self.replans += 1
+        return True
+
+    def _search_local(self) -> Optional[List[str]]:
+        if self._task is None:
+            self._task = ground(self.domain, self.problem)
+            self._task_index = {fact: 1 << i for i, fact in enumerate(self._task.facts)}
+        init = 0
+        for fact in self.state:
+            init |= self._task_index.get(fact, 0)
+        plan = search(self._task._replace(init=init))
+        if plan is None:
+            # Il grounding era potato rispetto allo stato iniziale: si riprova dallo stato corrente
+            problem = self.problem.model_copy(update={"init": self.state.to_text()})
+            self._task = ground(self.domain, problem)
+            self._task_index = {fact: 1 << i for i, fact in enumerate(self._task.facts)}
+            plan = search(self._task)
+        return None if plan is None else [str(step) for step in plan]
+
+    # Nuovo piano dallo stato corrente, senza LLM: planner locale, altrimenti Fast Downward
+    def replan(self) -> Optional[List[str]]:
+        try:
+            return self._search_local()
+        except (UnsupportedTask, TaskTooLarge, ValueError) as e:
+            print(f"Planner locale non utilizzabile ({e}), uso Fast Downward")
+        problem = self.problem.model_copy(update={"init": self.state.to_text()})
+        with open(os.path.join(self.cwd, "domain.pddl"), "w", encoding="utf-8") as f:
+            f.write(render_pddl_domain(self.domain))
+        with open(os.path.join(self.cwd, "problem.pddl"), "w", encoding="utf-8") as f:
+            f.write(render_pddl_problem(problem))
+        success, _, _ = run_fast_downward("domain.pddl", "problem.pddl", cwd=self.cwd)
+        return read_plan(os.path.join(self.cwd, "sas_plan")) if success else None
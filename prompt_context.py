@@ -0,0 +1,73 @@
+import os
+import re
+from typing import List
+
+from story_parser import iter_story_nodes
+
+
+# Compattazione del contesto dei prompt: ai prompt PDDL basta lo scheletro della storia
+# (stati e transizioni), e del log del planner servono solo le righe sull'errore
+COMPACT_CONTEXT = os.getenv("QUESTMASTER_COMPACT_CONTEXT", "1") == "1"
+PLANNER_LOG_LINES = int(os.getenv("QUESTMASTER_PLANNER_LOG_LINES", "40"))
+
+
+
+# Scheletro della storia: per ogni nodo i flag veri, le scelte con conseguenze e destinazioni
+# e il testo dei finali; prerequisiti e descrizioni narrative si omettono
+def story_skeleton(story: str) -> str:
+    flags: List[str] = []
+    sections = []
+    for node in iter_story_nodes(story.splitlines()):
+        lines = [f"{node.id} {node.marker}" if node.marker else node.id]
+        for name, value in node.state.items():
+            if name not in flags:
+                flags.append(name)
+            if value:
+                lines.append(f"- {name}")
+        lines += [f"→ {opt.text} [go to {opt.target}]" for opt in node.options]
+        lines += [f"Ending: {line}" for line in node.ending.splitlines() if line.strip()]
+        sections.append("\n".join(lines))
+    if not sections:
+        return ""
+    intro = f"State flags: {', '.join(flags)} (each section lists only the flags that are true)"
+    return "\n\n".join([intro] + sections)
+
+
+# Storia da mettere nei prompt: lo scheletro, oppure il testo completo se la storia
+# non è nel formato a sezioni numerate
+def story_context(story: str) -> str:
+    if not COMPACT_CONTEXT:
+        return story
+    skeleton = story_skeleton(story)
+    return skeleton if skeleton else story
+
+
+# Righe del log di Fast Downward o del validatore che descrivono l'errore
+relevant_line = re.compile(
+    r"error|undefined|unknown|not found|not defined|invalid|mismatch|expected|got:|exit code|abort|"
+    r"unsolvable|search stopped|no solution|traceback|exception|warning|❌|⚠️|\bline \d+",
+    re.IGNORECASE,
+)
+# Contesto utile prima di un errore del translator: l'azione che si stava analizzando
+context_line = re.compile(r"parsing (action|axiom|problem|domain)\b.*'", re.IGNORECASE)
+
+
+def trim_planner_log(log: str, max_lines: int = PLANNER_LOG_LINES) -> str:
+    lines = [line.rstrip() for line in log.splitlines() if line.strip()]
+    if not COMPACT_CONTEXT or len(lines) <= max_lines:
+        return "\n".join(lines)
+    keep = []
+    last_context = None
+    for i, line in enumerate(lines):
+        if context_line.search(line):
+            last_context = i
+        elif relevant_line.search(line):
+            if last_context is not None:
+                keep.append(last_context)
+                last_context = None
+            keep.append(i)
+    if not keep:
+        # Nessuna riga riconoscibile: la coda del log è la parte più informativa
+        return "\n".join(lines[-max_lines:])
+    selected = sorted(set(keep))[-max_lines:]
+    return "\n".join(lines[i] for i in selected)
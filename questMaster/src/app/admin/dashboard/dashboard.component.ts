@@ -1,7 +1,24 @@
-import { Component } from '@angular/core';
+import { Component, NgZone, OnDestroy } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
 import { CommonModule } from '@angular/common';
 
+interface JobEvent {
+  seq: number;
+  event: string;
+  stage?: string;
+  error?: string | null;
+  node_id?: string;
+  node?: { description: string; options: Record<string, { text: string; target: string }> };
+}
+
+interface JobStatus {
+  job_id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  stage: string | null;
+  error: string | null;
+  result: any;
+}
+
 @Component({
   selector: 'app-dashboard',
   standalone: true,
@@ -9,12 +26,17 @@ import { CommonModule } from '@angular/common';
   templateUrl: './dashboard.component.html',
   styleUrls: ['./dashboard.component.css']
 })
-export class DashboardComponent {
+export class DashboardComponent implements OnDestroy {
   isGenerating = false;
   storyResult: any = null;
   error: string | null = null;
+  stage: string | null = null;
+  storyNodes: { id: string; description: string }[] = [];
 
-  constructor(private http: HttpClient) {}
+  private apiBaseUrl = 'http://localhost:8080';
+  private events?: EventSource;
+
+  constructor(private http: HttpClient, private zone: NgZone) {}
 
   generateStory() {
     if (this.isGenerating) return;
@@ -22,16 +44,54 @@ export class DashboardComponent {
     this.isGenerating = true;
     this.error = null;
     this.storyResult = null;
+    this.stage = null;
+    this.storyNodes = [];
 
-    this.http.get('http://localhost:8080/genStory', {}).subscribe({
-      next: (response: any) => {
-        this.storyResult = response.success;
-        this.isGenerating = false;
-      },
+    this.http.get(`${this.apiBaseUrl}/genStory`, {}).subscribe({
+      next: (response: any) => this.streamJob(response.job_id),
       error: (error) => {
         this.error = `Errore: ${error.message}`;
         this.isGenerating = false;
       }
     });
   }
-}
\ No newline at end of file
+
+  // Eventi del job via SSE: i nodi della storia compaiono appena generati
+  private streamJob(jobId: string) {
+    this.events?.close();
+    const events = new EventSource(`${this.apiBaseUrl}/jobs/${jobId}/stream`);
+    this.events = events;
+
+    const on = (name: string, handler: (event: JobEvent) => void) =>
+      events.addEventListener(name, (message) =>
+        this.zone.run(() => handler(JSON.parse((message as MessageEvent).data)))
+      );
+
+    on('stage', (event) => this.stage = event.stage ?? null);
+    on('story_node', (event) => {
+      const node = { id: event.node_id!, description: event.node!.description };
+      const index = this.storyNodes.findIndex((n) => n.id === node.id);
+      if (index >= 0) {
+        this.storyNodes[index] = node;
+      } else {
+        this.storyNodes.push(node);
+      }
+    });
+    on('succeeded', () => {
+      events.close();
+      this.http.get<JobStatus>(`${this.apiBaseUrl}/jobs/${jobId}`).subscribe((job) => {
+        this.storyResult = job.result;
+        this.isGenerating = false;
+      });
+    });
+    on('failed', (event) => {
+      events.close();
+      this.error = `Errore: ${event.error}`;
+      this.isGenerating = false;
+    });
+  }
+
+  ngOnDestroy() {
+    this.events?.close();
+  }
+}
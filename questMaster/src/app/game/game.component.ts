@@ -2,6 +2,7 @@ import { Component, OnInit } from '@angular/core';
 import { HttpClient } from '@angular/common/http';
 import { CommonModule } from '@angular/common';
 import { HttpClientModule } from '@angular/common/http';
+import { Observable, forkJoin, map, of } from 'rxjs';
 
 interface GameOption {
   text: string;
@@ -17,6 +18,18 @@ interface GameGraph {
   [key: string]: GameNode;
 }
 
+// Struttura del grafo senza descrizioni (/getGraphSkeleton): i nodi si caricano quando servono
+interface GraphSkeleton {
+  start: string;
+  nodes: { [key: string]: { options: { [key: string]: string }; terminal: boolean; ending: 'success' | 'failure' | null } };
+}
+
+interface GraphNodeView {
+  id: string;
+  node: GameNode;
+  successors?: GameGraph;
+}
+
 @Component({
   selector: 'app-adventure-game',
   standalone: true,
@@ -789,6 +802,7 @@ interface GameGraph {
 export class GameComponent implements OnInit {
   gameState: 'initial' | 'playing' = 'initial';
   gameGraph: GameGraph = {};
+  skeleton: GraphSkeleton | null = null;
   currentNodeId: string = '';
   currentNode: GameNode | null = null;
   isGenerating = false;
@@ -830,9 +844,9 @@ export class GameComponent implements OnInit {
   }
 
   getProgressPercentage(): number {
-    if (!this.gameGraph || Object.keys(this.gameGraph).length === 0) return 0;
+    if (!this.skeleton || Object.keys(this.skeleton.nodes).length === 0) return 0;
 
-    const totalNodes = Object.keys(this.gameGraph).length;
+    const totalNodes = Object.keys(this.skeleton.nodes).length;
     const currentNodeNumber = parseInt(this.currentNodeId.replace('node_', '')) || 1;
 
     return Math.min((currentNodeNumber / totalNodes) * 100, 100);
@@ -864,9 +878,12 @@ export class GameComponent implements OnInit {
     this.isLoading = true;
     this.error = '';
 
-    this.http.get<GameGraph>(`${this.apiBaseUrl}/getGraph`).subscribe({
-      next: (graph) => {
-        this.gameGraph = graph;
+    forkJoin({
+      skeleton: this.http.get<GraphSkeleton>(`${this.apiBaseUrl}/getGraphSkeleton`),
+      start: this.fetchNode('node_1')
+    }).subscribe({
+      next: ({ skeleton }) => {
+        this.skeleton = skeleton;
         this.startGame();
         this.isLoading = false;
       },
@@ -878,6 +895,30 @@ export class GameComponent implements OnInit {
     });
   }
 
+  // Scarica un nodo insieme ai suoi successori, così la scelta successiva è già in memoria
+  fetchNode(nodeId: string): Observable<GameNode> {
+    return this.http.get<GraphNodeView>(`${this.apiBaseUrl}/graphNode/${encodeURIComponent(nodeId)}?successors=1`).pipe(
+      map((view) => {
+        this.gameGraph[view.id] = view.node;
+        Object.assign(this.gameGraph, view.successors || {});
+        return view.node;
+      })
+    );
+  }
+
+  ensureNode(nodeId: string): Observable<GameNode> {
+    const node = this.gameGraph[nodeId];
+    return node ? of(node) : this.fetchNode(nodeId);
+  }
+
+  prefetchSuccessors(nodeId: string) {
+    const targets = Object.values(this.skeleton?.nodes[nodeId]?.options || {})
+      .map((target) => target.replace(/\s*[✅❌]\s*$/, '').trim());
+    if (targets.some((target) => this.skeleton?.nodes[target] && !this.gameGraph[target])) {
+      this.fetchNode(nodeId).subscribe({ error: (err) => console.error('Error prefetch:', err) });
+    }
+  }
+
   startGame() {
     this.currentNodeId = 'node_1';
     this.currentNode = this.gameGraph[this.currentNodeId];
@@ -902,6 +943,20 @@ export class GameComponent implements OnInit {
     }
   }
 
+  enterNode(nodeId: string, node: GameNode) {
+    this.currentNodeId = nodeId;
+    this.currentNode = node;
+    this.isTyping = true;
+
+    // Stop typing animation
+    setTimeout(() => {
+      this.isTyping = false;
+    }, 1500);
+
+    this.checkGameEnd();
+    this.prefetchSuccessors(nodeId);
+  }
+
   selectOption(optionKey: string) {
     if (!this.currentNode || this.isTransitioning) return;
 
@@ -913,25 +968,27 @@ export class GameComponent implements OnInit {
 
     setTimeout(() => {
       const nextNodeId = option.target;
-      const cleanedNodeId = nextNodeId.replace(/\s*✅\s*$/, '').trim();
-
-      if (this.gameGraph[cleanedNodeId]) {
-        this.currentNodeId = cleanedNodeId;
-        this.currentNode = this.gameGraph[cleanedNodeId];
-        this.isTyping = true;
-
-        // Stop typing animation
-        setTimeout(() => {
-          this.isTyping = false;
-        }, 1500);
-
-        this.checkGameEnd();
-      } else {
-        console.log('Target node not found in graph, ending game');
-        this.isGameOver = true;
-        this.isWin = this.isWinningCondition(option.text, nextNodeId);
+      const cleanedNodeId = nextNodeId.replace(/\s*[✅❌]\s*$/, '').trim();
+
+      if (this.skeleton?.nodes[cleanedNodeId]) {
+        this.ensureNode(cleanedNodeId).subscribe({
+          next: (node) => {
+            this.enterNode(cleanedNodeId, node);
+            this.isTransitioning = false;
+          },
+          error: (err) => {
+            this.error = 'Error loading the next scene. Please try again.';
+            this.moveCount--;
+            this.isTransitioning = false;
+            console.error('Error graphNode:', err);
+          }
+        });
+        return;
       }
 
+      console.log('Target node not found in graph, ending game');
+      this.isGameOver = true;
+      this.isWin = this.isWinningCondition(option.text, nextNodeId);
       this.isTransitioning = false;
     }, 800);
   }
@@ -1043,6 +1100,7 @@ export class GameComponent implements OnInit {
     this.isTyping = false;
     this.error = '';
     this.gameGraph = {};
+    this.skeleton = null;
     this.isWin = false;
     this.moveCount = 0;
 
@@ -0,0 +1,233 @@
+import json
+import os
+import threading
+from collections import deque
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from story_parser import parse_story_nodes
+
+# pydantic e il planner servono solo a build_state_graph: le route di lettura non li importano
+if TYPE_CHECKING:
+    from pddl_models import PDDLDomain, PDDLProblem
+
+
+# Grafo degli stati raggiungibili del task ground, precalcolato dopo la generazione:
+# opzioni, vittoria/sconfitta e suggerimenti diventano lookup senza planner
+STATE_GRAPH_FILE = "state_graph.json"
+STATE_GRAPH_MAX_STATES = int(os.getenv("QUESTMASTER_STATE_GRAPH_MAX_STATES", "5000"))
+
+DEAD_END = -1
+
+
+class StateGraph:
+    def __init__(self, facts: List[str], actions: List[str], states: List[List[int]],
+                 edges: List[List[Tuple[int, int]]], distance: List[Optional[int]], truncated: bool):
+        self.facts = facts
+        self.actions = actions
+        self.states = states
+        self.edges = edges
+        # Distanza dall'obiettivo: 0 = vittoria, DEAD_END = obiettivo irraggiungibile,
+        # None = sconosciuta (grafo troncato al limite di stati)
+        self.distance = distance
+        self.truncated = truncated
+        self._fact_ids = {text: i for i, text in enumerate(facts)}
+        self._index = {self._bits(fact_ids): i for i, fact_ids in enumerate(states)}
+
+    @staticmethod
+    def _bits(fact_ids: Iterable[int]) -> int:
+        bits = 0
+        for i in fact_ids:
+            bits |= 1 << i
+        return bits
+
+    # Stato a partire dai fatti (testo PDDL); i fatti statici o sconosciuti si ignorano
+    def state_id(self, facts: Iterable[str]) -> Optional[int]:
+        return self._index.get(self._bits(self._fact_ids[f] for f in facts if f in self._fact_ids))
+
+    def options(self, state_id: int) -> List[Tuple[str, int]]:
+        return [(self.actions[a], succ) for a, succ in self.edges[state_id]]
+
+    def is_goal(self, state_id: int) -> bool:
+        return self.distance[state_id] == 0
+
+    def is_dead_end(self, state_id: int) -> bool:
+        return self.distance[state_id] == DEAD_END
+
+    # Azione che avvicina di più all'obiettivo
+    def hint(self, state_id: int) -> Optional[str]:
+        best = None
+        for a, succ in self.edges[state_id]:
+            d = self.distance[succ]
+            if d is not None and d != DEAD_END and (best is None or d < best[0]):
+                best = (d, a)
+        return self.actions[best[1]] if best else None
+
+    def node(self, state_id: int) -> dict:
+        return {
+            "id": state_id,
+            "facts": [self.facts[i] for i in self.states[state_id]],
+            "options": [{"action": action, "target": succ} for action, succ in self.options(state_id)],
+            "distance": self.distance[state_id],
+            "goal": self.is_goal(state_id),
+            "dead_end": self.is_dead_end(state_id),
+            "hint": self.hint(state_id),
+            "truncated": self.truncated,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "init": 0,
+            "truncated": self.truncated,
+            "facts": self.facts,
+            "actions": self.actions,
+            "states": self.states,
+            "edges": [[x for edge in edges for x in edge] for edges in self.edges],
+            "distance": self.distance,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StateGraph":
+        edges = [list(zip(flat[0::2], flat[1::2])) for flat in data["edges"]]
+        return cls(data["facts"], data["actions"], data["states"], edges, data["distance"], data["truncated"])
+
+
+def build_state_graph(domain: "PDDLDomain", problem: "PDDLProblem", max_states: int = STATE_GRAPH_MAX_STATES) -> StateGraph:
+    from strips_planner import TaskTooLarge, apply, applicable, ground, is_goal, search
+
+    task = ground(domain, problem)
+    states = [task.init]
+    index = {task.init: 0}
+    edges: List[List[Tuple[int, int]]] = []
+    action_ids: Dict[int, int] = {}
+    actions: List[str] = []
+    truncated = False
+
+    # Se la visita si ferma a max_states può non arrivare a nessun obiettivo: gli stati di un
+    # piano ottimo (o, se la ricerca è troppo grande, di uno greedy) entrano nel grafo per primi,
+    # così lo stato iniziale ha sempre la sua distanza
+    plan = []
+    for algorithm in ("bfs", "gbfs"):
+        try:
+            plan = search(task, algorithm)
+            break
+        except TaskTooLarge:
+            continue
+    state = task.init
+    for action in plan or []:
+        state = apply(action, state)
+        if state not in index:
+            index[state] = len(states)
+            states.append(state)
+
+    # Visita in ampiezza dallo stato iniziale, fino a max_states stati
+    queue = deque(range(len(states)))
+    while queue:
+        sid = queue.popleft()
+        state = states[sid]
+        out = []
+        for i, action in applicable(task, state):
+            succ = apply(action, state)
+            if succ not in index:
+                if len(states) >= max_states:
+                    truncated = True
+                    continue
+                index[succ] = len(states)
+                states.append(succ)
+                queue.append(index[succ])
+            if i not in action_ids:
+                action_ids[i] = len(actions)
+                actions.append(str(action))
+            out.append((action_ids[i], index[succ]))
+        # Gli stati escono dalla coda nell'ordine dei loro id
+        edges.append(out)
+
+    # Distanza dall'obiettivo con una visita all'indietro dagli stati obiettivo
+    predecessors: List[List[int]] = [[] for _ in states]
+    for sid, out in enumerate(edges):
+        for _, succ in out:
+            predecessors[succ].append(sid)
+    distance: List[Optional[int]] = [None] * len(states)
+    queue = deque(sid for sid, state in enumerate(states) if is_goal(task, state))
+    for sid in queue:
+        distance[sid] = 0
+    while queue:
+        sid = queue.popleft()
+        for pred in predecessors[sid]:
+            if distance[pred] is None:
+                distance[pred] = distance[sid] + 1
+                queue.append(pred)
+    # Senza troncamento ogni stato che non raggiunge l'obiettivo è un vicolo cieco; lo stesso se la
+    # ricerca ha esplorato tutto lo spazio senza piano, perché ogni stato è raggiungibile dall'iniziale
+    if not truncated or plan is None:
+        distance = [DEAD_END if d is None else d for d in distance]
+
+    facts = [f"({' '.join(fact)})" for fact in task.facts]
+    state_facts = [[i for i in range(len(facts)) if state >> i & 1] for state in states]
+    return StateGraph(facts, actions, state_facts, edges, distance, truncated)
+
+
+def write_state_graph(graph: StateGraph, output_file: str = STATE_GRAPH_FILE):
+    tmp_file = f"{output_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(graph.to_dict(), f, separators=(",", ":"))
+    os.replace(tmp_file, output_file)
+
+
+# Cache in memoria: il file viene riletto solo se cambiano mtime o dimensione
+_cache: Dict[str, Tuple[Tuple[int, int], StateGraph]] = {}
+_cache_lock = threading.Lock()
+
+
+def load_state_graph(file_path: str = STATE_GRAPH_FILE) -> StateGraph:
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"State graph '{file_path}' not found.")
+    key = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        cached = _cache.get(file_path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with open(file_path, encoding="utf-8") as f:
+            graph = StateGraph.from_dict(json.load(f))
+        _cache[file_path] = (key, graph)
+        return graph
+
+
+# Verifica offline che il grafo di story.txt sia coerente con il PDDL:
+# lo "Current State" di ogni nodo deve corrispondere ad almeno uno stato raggiungibile,
+# e ogni scelta deve avere una transizione PDDL tra stati corrispondenti
+def verify_story(graph: StateGraph, story: str) -> List[str]:
+    nodes = parse_story_nodes(story)
+    predicates = [set() for _ in graph.states]
+    known = set()
+    for sid, fact_ids in enumerate(graph.states):
+        for i in fact_ids:
+            predicates[sid].add(graph.facts[i].strip("()").split()[0])
+    for text in graph.facts:
+        known.add(text.strip("()").split()[0])
+
+    matches: Dict[str, set] = {}
+    issues = []
+    for node in nodes:
+        node_id = f"node_{node.id}"
+        expected = {k.replace("_", "-").lower(): v for k, v in node.state.items()}
+        expected = {k: v for k, v in expected.items() if k in known}
+        matches[node_id] = {
+            sid for sid, preds in enumerate(predicates)
+            if all((k in preds) == v for k, v in expected.items())
+        }
+        if not matches[node_id]:
+            issues.append(f"{node_id} (line {node.line}): no reachable PDDL state matches its Current State")
+
+    for node in nodes:
+        node_id = f"node_{node.id}"
+        for option in node.options:
+            target = f"node_{option.target.split()[0]}"
+            if target not in matches or not matches[node_id] or not matches[target]:
+                continue
+            if not any(succ in matches[target] for sid in matches[node_id] for _, succ in graph.edges[sid]):
+                issues.append(f"{node_id} -> {target} (line {option.line}): no PDDL action leads between the matching states")
+    if graph.truncated:
+        issues.append(f"state graph truncated at {len(graph.states)} states: results are partial")
+    return issues
@@ -0,0 +1,248 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from story_parser import StoryNode, StoryParser, graph_node, iter_story_nodes, story_graph
+
+
+STORY_FILE = "story.txt"
+GRAPH_JSON_FILE = "langgraph_adventure.json"
+
+
+# Parsing della storia nel formato letto dal GameComponent
+def parse_story(story: str) -> Dict[str, dict]:
+    story = story.strip()
+    if not story:
+        raise ValueError("Story file is empty or invalid.")
+    return story_graph(iter_story_nodes(story.splitlines()))
+
+
+# Parsing incrementale durante lo streaming: un nodo è completo solo quando inizia il nodo
+# successivo o finisce lo stream; il separatore "---" non basta, perché un "---" isolato
+# prima della fine del nodo ne pubblicherebbe una versione parziale
+class StoryStreamParser:
+    def __init__(self):
+        self.text = ""
+        self._line = ""
+        self._parser = StoryParser()
+        self._done = set()
+
+    def _emit(self, node: Optional[StoryNode], completed: Dict[str, dict]):
+        if node is not None and node.id not in self._done:
+            self._done.add(node.id)
+            completed[f"node_{node.id}"] = graph_node(node)
+
+    def _feed_line(self, line: str, completed: Dict[str, dict]):
+        self._emit(self._parser.feed_line(line), completed)
+
+    # Aggiunge un pezzo di testo e restituisce i nodi completati nel frattempo
+    def feed(self, chunk: str) -> Dict[str, dict]:
+        self.text += chunk
+        completed = {}
+        *lines, self._line = (self._line + chunk).split("\n")
+        for line in lines:
+            self._feed_line(line, completed)
+        return completed
+
+    # Fine dello stream: l'ultimo nodo è completo
+    def finish(self) -> Dict[str, dict]:
+        completed = {}
+        if self._line:
+            self._feed_line(self._line, completed)
+            self._line = ""
+        self._emit(self._parser.finish(), completed)
+        return completed
+
+
+def write_graph_json(graph: Dict[str, dict], output_file: str = GRAPH_JSON_FILE):
+    tmp_file = f"{output_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(graph, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_file, output_file)
+
+
+# Risposta di /getGraph già pronta: JSON serializzato una volta, versioni compresse ed ETag
+# forte derivato dal contenuto di story.txt
+class GraphPayload(NamedTuple):
+    etag: str
+    body: bytes
+    encoded: Dict[str, bytes]
+
+
+def build_graph_payload(data, etag: str) -> GraphPayload:
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    encoded = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        encoded["br"] = brotli.compress(body)
+    return GraphPayload(etag, body, encoded)
+
+
+def node_target(option: dict) -> str:
+    # "node_14 ❌" -> "node_14"
+    return option["target"].split()[0]
+
+
+def ending_kind(node: dict) -> Optional[str]:
+    if node["options"]:
+        return None
+    if "✅" in node["description"]:
+        return "success"
+    if "❌" in node["description"]:
+        return "failure"
+    return None
+
+
+# Struttura del grafo senza descrizioni: id, destinazioni delle scelte e finali
+def graph_skeleton(graph: Dict[str, dict]) -> dict:
+    return {
+        "start": "node_1" if "node_1" in graph else next(iter(graph), None),
+        "nodes": {
+            node_id: {
+                "options": {key: node_target(option) for key, option in node["options"].items()},
+                "terminal": not node["options"],
+                "ending": ending_kind(node),
+            }
+            for node_id, node in graph.items()
+        },
+    }
+
+
+# Un nodo e, se richiesto, i nodi raggiungibili con una scelta
+def graph_node_view(graph: Dict[str, dict], node_id: str, successors: bool = False) -> dict:
+    view = {"id": node_id, "node": graph[node_id]}
+    if successors:
+        targets = dict.fromkeys(node_target(option) for option in graph[node_id]["options"].values())
+        view["successors"] = {target: graph[target] for target in targets if target in graph and target != node_id}
+    return view
+
+
+# Cache del grafo: story.txt viene riletto solo se cambiano mtime o dimensione
+class GraphCache:
+    def __init__(self, file_path: str = STORY_FILE, output_file: Optional[str] = GRAPH_JSON_FILE):
+        self.file_path = file_path
+        self.output_file = output_file
+        self._lock = threading.Lock()
+        # (chiave del file, grafo, payload, viste derivate), sostituiti insieme
+        self._state: Optional[Tuple[Tuple[int, int], Dict[str, dict], GraphPayload, Dict[str, GraphPayload]]] = None
+
+    def _stat_key(self) -> Tuple[int, int]:
+        try:
+            st = os.stat(self.file_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Story file '{self.file_path}' not found.")
+        return st.st_mtime_ns, st.st_size
+
+    def _current(self) -> Tuple[Tuple[int, int], Dict[str, dict], GraphPayload, Dict[str, GraphPayload]]:
+        key = self._stat_key()
+        state = self._state
+        if state is not None and state[0] == key:
+            return state
+
+        with self._lock:
+            key = self._stat_key()
+            state = self._state
+            if state is not None and state[0] == key:
+                return state
+
+            try:
+                with open(self.file_path, "rb") as file:
+                    data = file.read()
+            except FileNotFoundError:
+                raise FileNotFoundError(f"Story file '{self.file_path}' not found.")
+
+            try:
+                graph = parse_story(data.decode("utf-8"))
+            except Exception as e:
+                raise ValueError(f"Error parsing story file: {str(e)}")
+
+            if self.output_file:
+                try:
+                    write_graph_json(graph, self.output_file)
+                except Exception as e:
+                    print(f"Error saving graph: {e}")
+
+            state = self._state = (key, graph, build_graph_payload(graph, hashlib.sha256(data).hexdigest()), {})
+            return state
+
+    def get(self) -> Dict[str, dict]:
+        return self._current()[1]
+
+    def payload(self) -> GraphPayload:
+        return self._current()[2]
+
+    # Viste derivate dal grafo, serializzate e compresse una volta per versione di story.txt
+    def _view(self, name: str, build) -> GraphPayload:
+        _, graph, payload, views = self._current()
+        view = views.get(name)
+        if view is None:
+            view = views[name] = build_graph_payload(build(graph), f"{payload.etag}-{name}")
+        return view
+
+    def skeleton(self) -> GraphPayload:
+        return self._view("skeleton", graph_skeleton)
+
+    # KeyError se il nodo non esiste
+    def node(self, node_id: str, successors: bool = False) -> GraphPayload:
+        return self._view(f"{node_id}-{int(successors)}", lambda graph: graph_node_view(graph, node_id, successors))
+
+    def invalidate(self):
+        with self._lock:
+            self._state = None
+
+
+# Una cache per file: quella di story.txt resta sempre, quelle dei grafi dei job sono LRU
+GRAPH_CACHE_MAX_FILES = int(os.getenv("QUESTMASTER_GRAPH_CACHE_MAX_FILES", "8"))
+
+_caches: "OrderedDict[str, GraphCache]" = OrderedDict()
+_caches_lock = threading.Lock()
+
+
+def get_graph_cache(file_path: str = STORY_FILE) -> GraphCache:
+    with _caches_lock:
+        cache = _caches.get(file_path)
+        if cache is None:
+            # Il JSON si scrive solo per la storia pubblicata, non per le letture dei grafi dei job
+            cache = _caches[file_path] = GraphCache(file_path, GRAPH_JSON_FILE if file_path == STORY_FILE else None)
+        _caches.move_to_end(file_path)
+        others = [path for path in _caches if path != STORY_FILE]
+        for path in others[:max(0, len(others) - GRAPH_CACHE_MAX_FILES)]:
+            del _caches[path]
+        return cache
+
+
+# Da chiamare quando il file sparisce (workspace del job eliminato)
+def evict_graph_cache(file_path: str):
+    with _caches_lock:
+        _caches.pop(file_path, None)
+
+
+def loadGraph(file_path=STORY_FILE):
+    return get_graph_cache(file_path).get()
+
+
+def load_graph_payload(file_path=STORY_FILE) -> GraphPayload:
+    return get_graph_cache(file_path).payload()
+
+
+def load_graph_skeleton(file_path=STORY_FILE) -> GraphPayload:
+    return get_graph_cache(file_path).skeleton()
+
+
+def load_graph_node(node_id: str, successors: bool = False, file_path=STORY_FILE) -> GraphPayload:
+    return get_graph_cache(file_path).node(node_id, successors)
+
+
+def saveGraphToJson(file_path=STORY_FILE, output_file=GRAPH_JSON_FILE):
+    try:
+        write_graph_json(loadGraph(file_path), output_file)
+    except Exception as e:
+        print(f"Error saving graph: {e}")
@@ -0,0 +1,102 @@
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+# Generazione della storia in due fasi: prima una scaletta breve (nodi, variabili di stato,
+# archi [go to N]), poi la narrativa di ogni nodo in parallelo, assemblata nel formato di story.txt
+class OutlineChoice(BaseModel):
+    action: str
+    consequence: Dict[str, bool]
+    target: int
+
+class OutlineNode(BaseModel):
+    id: int
+    title: str
+    ending: Optional[str] = None  # "success" | "failure"
+    state: Dict[str, bool]
+    choices: List[OutlineChoice] = []
+
+class StoryOutline(BaseModel):
+    state_variables: List[str]
+    nodes: List[OutlineNode]
+
+class NodeSection(BaseModel):
+    prerequisites: str
+    narrative: str
+    ending: Optional[str] = None
+
+
+ENDING_MARKERS = {"success": "✅", "failure": "❌"}
+
+
+def parse_json_object(content: str) -> dict:
+    match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', content, re.DOTALL)
+    return json.loads(match.group(1) if match else content.strip().strip("`"))
+
+
+def parse_outline(content: str) -> StoryOutline:
+    outline = StoryOutline(**parse_json_object(content))
+    ids = {node.id for node in outline.nodes}
+    if not ids:
+        raise ValueError("Story outline has no nodes")
+    if len(ids) != len(outline.nodes):
+        raise ValueError("Story outline has duplicate node ids")
+    for node in outline.nodes:
+        if node.ending is not None and node.ending not in ENDING_MARKERS:
+            raise ValueError(f"Node {node.id}: unknown ending '{node.ending}'")
+        for choice in node.choices:
+            if choice.target not in ids:
+                raise ValueError(f"Node {node.id}: choice targets undefined node {choice.target}")
+    return outline
+
+
+# Riassunto compatto della scaletta da passare a ogni chiamata per nodo
+def outline_summary(outline: StoryOutline) -> str:
+    lines = []
+    for node in outline.nodes:
+        marker = f" {ENDING_MARKERS[node.ending]}" if node.ending else ""
+        edges = ", ".join(f"{c.action} -> {c.target}" for c in node.choices)
+        lines.append(f"{node.id}{marker}: {node.title}" + (f" [{edges}]" if edges else ""))
+    return "\n".join(lines)
+
+
+def _flag(value: bool) -> str:
+    return "true" if value else "false"
+
+
+def render_node(outline: StoryOutline, node: OutlineNode, section: NodeSection) -> str:
+    marker = f" {ENDING_MARKERS[node.ending]}" if node.ending else ""
+    lines = [f"{node.id}{marker}  ", "**Current State:**  "]
+    lines += [f"- {name}: {_flag(node.state.get(name, False))}  " for name in outline.state_variables]
+    lines += ["", "**Prerequisites:**  ", section.prerequisites.strip(), "", "**Narrative Description:**  ", section.narrative.strip(), ""]
+    if node.ending:
+        lines += ["**Ending:**  ", f"{(section.ending or node.title).strip()}{marker}  ", ""]
+    else:
+        lines.append("**Choices:**  ")
+        for choice in node.choices:
+            consequence = ", ".join(f"{k}: {_flag(v)}" for k, v in choice.consequence.items())
+            # Destinazione senza marcatore: il finale è segnato solo nell'intestazione del nodo
+            lines.append(f"→ *{choice.action}*: ({consequence}) [go to {choice.target}]  ")
+        lines.append("")
+    lines.append("---")
+    return "\n".join(lines)
+
+
+# Le chiamate per nodo girano in parallelo (al massimo max_workers alla volta);
+# on_node riceve ogni nodo appena pronto, la storia si assembla nell'ordine della scaletta
+def generate_sections(outline: StoryOutline, write_node: Callable[[OutlineNode], NodeSection],
+                      max_workers: int = 8, on_node: Optional[Callable[[str], None]] = None) -> str:
+    rendered: Dict[int, str] = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="questmaster-story") as executor:
+        futures = {executor.submit(write_node, node): node for node in outline.nodes}
+        for future in as_completed(futures):
+            node = futures[future]
+            text = render_node(outline, node, future.result())
+            rendered[node.id] = text
+            if on_node:
+                on_node(text)
+    return "\n\n".join(rendered[node.id] for node in outline.nodes)
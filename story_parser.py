@@ -0,0 +1,145 @@
+import re
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+
+# Parser di story.txt in una sola passata, riga per riga: ogni riga viene esaminata una volta,
+# senza espressioni regolari sull'intero testo, quindi il tempo cresce linearmente con la storia
+header_line = re.compile(r'^\s*(\d+)\.?[ \t]*([✅❌]?)[ \t]*$')
+section_line = re.compile(r'^\*\*([^*]+?):?\*\*:?[ \t]*(.*)$')
+flag_line = re.compile(r'^\s*-\s*([\w-]+)\s*:\s*(true|false)\s*$', re.IGNORECASE)
+target_pattern = re.compile(r'\[go to (\d+(?:\s*[✅❌])?)\]')
+
+ENDING_MARKERS = ("✅", "❌")
+
+
+class StoryOption(NamedTuple):
+    text: str
+    target: str  # numero del nodo, con l'eventuale marcatore di finale ("14 ❌")
+    line: int
+
+
+class StoryNode(NamedTuple):
+    id: str
+    line: int
+    marker: str
+    description: str
+    state: Dict[str, bool]
+    prerequisites: str
+    narrative: str
+    ending: str
+    options: List[StoryOption]
+
+    # Nodo finale: marcatore nell'intestazione o nel testo, come nel formato letto dal GameComponent
+    @property
+    def is_ending(self) -> bool:
+        return bool(self.marker) or any(m in self.description for m in ENDING_MARKERS)
+
+
+class StoryParser:
+    def __init__(self):
+        self._node = None
+        self._lineno = 0
+
+    def _start(self, number: str, marker: str, rest: str):
+        self._node = {
+            "id": number, "line": self._lineno, "marker": marker, "description": [rest] if rest else [],
+            "sections": {}, "section": None, "state_block": False, "state": {}, "choices": [],
+        }
+
+    def _build(self) -> StoryNode:
+        node = self._node
+        options = []
+        for start, lines in node["choices"]:
+            text = "\n".join(lines).strip()
+            # Prima destinazione dopo il testo della scelta: una ricerca lineare, senza backtracking
+            match = target_pattern.search(text, 1)
+            if match:
+                options.append(StoryOption(text[:match.start()].strip(), match.group(1).strip(), start))
+        sections = {name: "\n".join(lines).strip() for name, lines in node["sections"].items()}
+        return StoryNode(
+            node["id"], node["line"], node["marker"], "\n".join(node["description"]).strip(), node["state"],
+            sections.get("prerequisites", ""), sections.get("narrative description", ""), sections.get("ending", ""),
+            options,
+        )
+
+    # Aggiunge una riga; restituisce il nodo precedente quando ne inizia uno nuovo
+    def feed_line(self, line: str) -> Optional[StoryNode]:
+        self._lineno += 1
+        line = line.rstrip("\r\n")
+        stripped = line.strip()
+        if stripped[:1].isdigit():
+            header = header_line.match(line)
+            if header:
+                finished = self.finish()
+                # Come nel formato originale, il resto dell'intestazione apre la descrizione ("❌")
+                self._start(header.group(1), header.group(2), line[header.start(2):].lstrip())
+                return finished
+        node = self._node
+        if node is None:
+            return None
+        if stripped.startswith("→"):
+            node["choices"].append((self._lineno, [stripped[1:].strip()]))
+            return None
+        if node["choices"]:
+            # Tutto ciò che segue la prima scelta appartiene alle scelte
+            node["choices"][-1][1].append(line)
+            return None
+        node["description"].append(line)
+        if stripped.startswith("---"):
+            node["section"] = None
+        elif stripped.startswith("**"):
+            section = section_line.match(stripped)
+            if section:
+                name = section.group(1).strip().lower()
+                node["section"] = node["sections"].setdefault(name, [])
+                if section.group(2):
+                    node["section"].append(section.group(2))
+                node["state_block"] = name == "current state"
+                return None
+        if node["state_block"]:
+            flag = flag_line.match(stripped)
+            if flag:
+                node["state"][flag.group(1)] = flag.group(2).lower() == "true"
+                return None
+        if node["section"] is not None:
+            node["section"].append(stripped)
+        return None
+
+    # Nodo in corso di lettura (per lo streaming), senza chiuderlo
+    def current(self) -> Optional[StoryNode]:
+        return self._build() if self._node is not None else None
+
+    def finish(self) -> Optional[StoryNode]:
+        node = self.current()
+        self._node = None
+        return node
+
+
+def iter_story_nodes(lines: Iterable[str]) -> Iterator[StoryNode]:
+    parser = StoryParser()
+    for line in lines:
+        node = parser.feed_line(line)
+        if node is not None:
+            yield node
+    node = parser.finish()
+    if node is not None:
+        yield node
+
+
+def parse_story_nodes(story: str) -> List[StoryNode]:
+    return list(iter_story_nodes(story.splitlines()))
+
+
+# Formato del grafo servito da /getGraph e letto dal GameComponent
+def graph_node(node: StoryNode) -> dict:
+    return {
+        "description": node.description,
+        "options": {} if node.is_ending else {
+            f"option_{i}": {"text": opt.text, "target": f"node_{opt.target}"}
+            for i, opt in enumerate(node.options)
+        },
+    }
+
+
+def story_graph(nodes: Iterable[StoryNode]) -> Dict[str, dict]:
+    return {f"node_{node.id}": graph_node(node) for node in nodes}
@@ -0,0 +1,397 @@
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from pddl_models import PDDLDomain, PDDLProblem, parse_pddl_domain, parse_pddl_problem
+from pddl_text import PDDLSyntaxError, find_define, parse_sexp, parse_typed_list, sections, strip_fences
+
+
+# Planner STRIPS (con tipi e precondizioni negative) che gira nel processo:
+# per le quest piccole evita l'avvio di Fast Downward
+LOCAL_PLANNER_MAX_ACTIONS = int(os.getenv("QUESTMASTER_LOCAL_PLANNER_MAX_ACTIONS", "20000"))
+LOCAL_PLANNER_MAX_STATES = int(os.getenv("QUESTMASTER_LOCAL_PLANNER_MAX_STATES", "200000"))
+# "gbfs" (greedy con hFF), "astar" (A* con hFF) o "bfs" (ampiezza, piano di lunghezza minima)
+LOCAL_PLANNER_SEARCH = os.getenv("QUESTMASTER_LOCAL_PLANNER_SEARCH", "gbfs")
+
+UNSOLVABLE_LOG = "Completely explored state space -- no solution!\nSearch stopped without finding a solution.\n"
+
+# Sezioni che il planner locale interpreta; parse_pddl_domain ignora le altre (:derived, :functions,
+# :constraints, :durative-action, ...), quindi con una di queste il task va a Fast Downward
+DOMAIN_SECTIONS = {"domain", ":requirements", ":types", ":predicates", ":action"}
+PROBLEM_SECTIONS = {"problem", ":domain", ":requirements", ":objects", ":init", ":goal"}
+
+
+class UnsupportedTask(ValueError):
+    pass
+
+
+class TaskTooLarge(ValueError):
+    pass
+
+
+class GroundAction(NamedTuple):
+    name: str
+    args: Tuple[str, ...]
+    pre_pos: int
+    pre_neg: int
+    add: int
+    delete: int
+
+    def __str__(self):
+        return f"({' '.join((self.name,) + self.args)})"
+
+
+# Fatti come tuple (predicato, oggetti...) numerate; lo stato è un intero usato come bitset
+class GroundTask(NamedTuple):
+    facts: List[Tuple[str, ...]]
+    actions: List[GroundAction]
+    init: int
+    goal_pos: int
+    goal_neg: int
+    # Per l'euristica: precondizioni e aggiunte come liste di indici, azioni per precondizione
+    pre_lists: List[List[int]]
+    add_lists: List[List[int]]
+    precondition_of: List[List[int]]
+
+    def state_facts(self, state: int) -> List[Tuple[str, ...]]:
+        return [self.facts[i] for i in _bits(state)]
+
+
+def _bits(mask: int):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _parse(items: List[str]) -> list:
+    exprs = []
+    for item in items:
+        try:
+            exprs.extend(parse_sexp(item))
+        except PDDLSyntaxError as e:
+            raise UnsupportedTask(str(e))
+    return exprs
+
+
+def check_sections(domain_text: str, problem_text: str):
+    for text, known in ((domain_text, DOMAIN_SECTIONS), (problem_text, PROBLEM_SECTIONS)):
+        try:
+            define = find_define(strip_fences(text))
+        except PDDLSyntaxError as e:
+            raise UnsupportedTask(str(e))
+        unknown = sorted(set(sections(define)) - known)
+        if unknown:
+            raise UnsupportedTask(f"Unsupported sections: {', '.join(unknown)}")
+
+
+# Scompone una congiunzione in letterali (positivo, atomo); il resto non è STRIPS
+def _literals(exprs: list) -> List[Tuple[bool, tuple]]:
+    result = []
+    for expr in exprs:
+        if not isinstance(expr, list) or not expr:
+            continue
+        if expr[0] == "and":
+            result.extend(_literals(expr[1:]))
+        elif expr[0] == "not" and len(expr) == 2 and isinstance(expr[1], list):
+            if expr[1] and expr[1][0] in ("and", "or", "not", "imply", "when", "forall", "exists"):
+                raise UnsupportedTask(f"Unsupported formula: not {expr[1][0]}")
+            result.append((False, tuple(expr[1])))
+        elif expr[0] in ("or", "imply", "when", "forall", "exists") or any(isinstance(a, list) for a in expr[1:]):
+            raise UnsupportedTask(f"Unsupported formula: {expr[0]}")
+        else:
+            result.append((True, tuple(expr)))
+    return result
+
+
+def _objects_by_type(domain: PDDLDomain, problem: PDDLProblem) -> Dict[str, List[str]]:
+    parents = dict(parse_typed_list(" ".join(domain.types).split()))
+    table: Dict[str, List[str]] = {"object": []}
+    for obj, type_ in problem.objects.items():
+        seen = set()
+        while type_ not in seen:
+            seen.add(type_)
+            table.setdefault(type_, []).append(obj)
+            if type_ == "object":
+                break
+            type_ = parents.get(type_, "object")
+    return table
+
+
+# Atomo dello schema -> funzione che, dati i valori dei parametri, costruisce l'atomo ground
+def _compile_atom(atom: tuple, names: List[str]):
+    slots = tuple(names.index(a) if a in names else a for a in atom[1:])
+    head = (atom[0],)
+    if not slots:
+        return lambda values: head
+    return lambda values: head + tuple(values[s] if isinstance(s, int) else s for s in slots)
+
+
+def ground(domain: PDDLDomain, problem: PDDLProblem, max_actions: int = LOCAL_PLANNER_MAX_ACTIONS) -> GroundTask:
+    objects = _objects_by_type(domain, problem)
+    schemas = []
+    for action in domain.actions:
+        params = parse_typed_list(" ".join(action.parameters).split())
+        effects = _literals(_parse(action.effects))
+        if any(atom[0] == "=" for _, atom in effects):
+            raise UnsupportedTask(f"Equality in the effects of {action.name}")
+        schemas.append((action.name, params, _literals(_parse(action.preconditions)), effects))
+
+    # Predicati statici (mai negli effetti): si verificano durante il grounding e non entrano nello stato
+    fluent = {atom[0] for _, _, _, effects in schemas for _, atom in effects}
+    init_atoms = set()
+    for positive, atom in _literals(_parse(problem.init)):
+        if atom[0] == "=":
+            raise UnsupportedTask("Equality in :init")
+        if positive:
+            init_atoms.add(atom)
+
+    facts: List[Tuple[str, ...]] = []
+    index: Dict[Tuple[str, ...], int] = {}
+
+    def fact_bit(atom: tuple) -> int:
+        bit = index.get(atom)
+        if bit is None:
+            bit = index[atom] = 1 << len(facts)
+            facts.append(atom)
+        return bit
+
+    actions: List[GroundAction] = []
+    for name, params, preconditions, effects in schemas:
+        names = [p for p, _ in params]
+        domains = [objects.get(t, []) for _, t in params]
+        static = [(pos, atom[0] == "=", _compile_atom(atom, names)) for pos, atom in preconditions
+                  if atom[0] == "=" or atom[0] not in fluent]
+        dynamic = [(pos, _compile_atom(atom, names)) for pos, atom in preconditions
+                   if not (atom[0] == "=" or atom[0] not in fluent)]
+        compiled_effects = [(pos, _compile_atom(atom, names)) for pos, atom in effects]
+        for values in itertools.product(*domains):
+            ok = True
+            for pos, equality, make in static:
+                ground_atom = make(values)
+                holds = ground_atom[1] == ground_atom[2] if equality else ground_atom in init_atoms
+                if holds != pos:
+                    ok = False
+                    break
+            if not ok:
+                continue
+            pre_pos = pre_neg = add = delete = 0
+            for pos, make in dynamic:
+                bit = fact_bit(make(values))
+                if pos:
+                    pre_pos |= bit
+                else:
+                    pre_neg |= bit
+            for pos, make in compiled_effects:
+                bit = fact_bit(make(values))
+                if pos:
+                    add |= bit
+                else:
+                    delete |= bit
+            # Come in Fast Downward: se un fatto viene sia tolto che aggiunto, vince l'aggiunta
+            actions.append(GroundAction(name, tuple(values), pre_pos, pre_neg, add, delete & ~add))
+            if len(actions) > max_actions:
+                raise TaskTooLarge(f"More than {max_actions} ground actions")
+
+    init = 0
+    for atom in init_atoms:
+        if atom[0] in fluent:
+            init |= fact_bit(atom)
+    goal_pos = goal_neg = 0
+    for pos, atom in _literals(_parse(problem.goal)):
+        if atom[0] not in fluent and atom[0] != "=":
+            # Obiettivo statico: o è già vero o il problema è irrisolvibile
+            if (atom in init_atoms) != pos:
+                goal_pos |= fact_bit(("__unreachable__",))
+            continue
+        if atom[0] == "=":
+            if (atom[1] == atom[2]) != pos:
+                goal_pos |= fact_bit(("__unreachable__",))
+            continue
+        if pos:
+            goal_pos |= fact_bit(atom)
+        else:
+            goal_neg |= fact_bit(atom)
+
+    # Si tengono solo le azioni raggiungibili nel problema rilassato
+    reached, changed = init, True
+    while changed:
+        changed = False
+        for action in actions:
+            if reached & action.pre_pos == action.pre_pos and action.add & ~reached:
+                reached |= action.add
+                changed = True
+    actions = [a for a in actions if reached & a.pre_pos == a.pre_pos]
+
+    pre_lists = [list(_bits(a.pre_pos)) for a in actions]
+    add_lists = [list(_bits(a.add)) for a in actions]
+    precondition_of: List[List[int]] = [[] for _ in facts]
+    for i, pre in enumerate(pre_lists):
+        for fact in pre:
+            precondition_of[fact].append(i)
+    return GroundTask(facts, actions, init, goal_pos, goal_neg, pre_lists, add_lists, precondition_of)
+
+
+def is_goal(task: GroundTask, state: int) -> bool:
+    return state & task.goal_pos == task.goal_pos and not state & task.goal_neg
+
+
+def applicable(task: GroundTask, state: int):
+    for i, action in enumerate(task.actions):
+        if state & action.pre_pos == action.pre_pos and not state & action.pre_neg:
+            yield i, action
+
+
+def apply(action: GroundAction, state: int) -> int:
+    return (state & ~action.delete) | action.add
+
+
+# Euristica FF: raggiungibilità rilassata (senza delete e precondizioni negative) a contatori,
+# poi lunghezza del piano rilassato estratto; None se l'obiettivo è irraggiungibile
+def hff(task: GroundTask, state: int) -> Optional[int]:
+    goals = list(_bits(task.goal_pos & ~state))
+    if not goals:
+        return 0
+    missing = len(goals)
+    goal_set = set(goals)
+    achiever: Dict[int, int] = {}
+    reached = set(_bits(state))
+    counters = [len(pre) for pre in task.pre_lists]
+    for fact in reached:
+        for i in task.precondition_of[fact]:
+            counters[i] -= 1
+    queue = deque(i for i, count in enumerate(counters) if count == 0)
+    while queue and missing:
+        i = queue.popleft()
+        for fact in task.add_lists[i]:
+            if fact in reached:
+                continue
+            reached.add(fact)
+            achiever[fact] = i
+            if fact in goal_set:
+                missing -= 1
+            for j in task.precondition_of[fact]:
+                counters[j] -= 1
+                if counters[j] == 0:
+                    queue.append(j)
+    if missing:
+        return None
+
+    chosen = set()
+    stack = goals
+    while stack:
+        fact = stack.pop()
+        i = achiever.get(fact)
+        if i is None or i in chosen:
+            continue
+        chosen.add(i)
+        stack.extend(task.pre_lists[i])
+    return len(chosen)
+
+
+def _extract(parents: Dict[int, Tuple[int, int]], task: GroundTask, state: int) -> List[GroundAction]:
+    plan = []
+    while parents[state][1] >= 0:
+        state, i = parents[state]
+        plan.append(task.actions[i])
+    plan.reverse()
+    return plan
+
+
+# Restituisce il piano, oppure None se lo spazio degli stati è stato esplorato senza soluzione
+def search(task: GroundTask, algorithm: str = LOCAL_PLANNER_SEARCH,
+           max_states: int = LOCAL_PLANNER_MAX_STATES) -> Optional[List[GroundAction]]:
+    parents: Dict[int, Tuple[int, int]] = {task.init: (task.init, -1)}
+    if is_goal(task, task.init):
+        return []
+
+    if algorithm == "bfs":
+        queue = deque([task.init])
+        while queue:
+            state = queue.popleft()
+            for i, action in applicable(task, state):
+                succ = apply(action, state)
+                if succ in parents:
+                    continue
+                parents[succ] = (state, i)
+                if is_goal(task, succ):
+                    return _extract(parents, task, succ)
+                if len(parents) > max_states:
+                    raise TaskTooLarge(f"More than {max_states} states expanded")
+                queue.append(succ)
+        return None
+
+    # gbfs è "lazy" come lazy_greedy di Fast Downward: i successori ereditano l'h del padre
+    # e l'euristica si calcola solo quando uno stato viene espanso
+    lazy = algorithm != "astar"
+    counter = itertools.count()
+    open_list = [(0, 0, next(counter), task.init, task.init, -1)]
+    g_values = {task.init: 0}
+    closed = set()
+    while open_list:
+        _, g, _, state, parent, i = heapq.heappop(open_list)
+        if state in closed:
+            continue
+        if lazy:
+            h = hff(task, state)
+            if h is None:
+                closed.add(state)
+                continue
+            parents.setdefault(state, (parent, i))
+        closed.add(state)
+        if is_goal(task, state):
+            return _extract(parents, task, state)
+        if len(closed) > max_states:
+            raise TaskTooLarge(f"More than {max_states} states expanded")
+        for i, action in applicable(task, state):
+            succ = apply(action, state)
+            if succ in closed:
+                continue
+            if lazy:
+                heapq.heappush(open_list, (h, g + 1, next(counter), succ, state, i))
+                continue
+            if g_values.get(succ, g + 2) <= g + 1:
+                continue
+            h_succ = hff(task, succ)
+            if h_succ is None:
+                continue
+            g_values[succ] = g + 1
+            parents[succ] = (state, i)
+            heapq.heappush(open_list, (g + 1 + h_succ, g + 1, next(counter), succ, state, i))
+    return None
+
+
+def format_plan(plan: List[GroundAction]) -> str:
+    return "".join(f"{action}\n" for action in plan) + f"; cost = {len(plan)} (unit cost)\n"
+
+
+def solve(domain: PDDLDomain, problem: PDDLProblem, algorithm: str = LOCAL_PLANNER_SEARCH) -> Optional[List[GroundAction]]:
+    return search(ground(domain, problem), algorithm)
+
+
+# Percorso veloce per run_planner_node: stesso risultato di run_fast_downward,
+# oppure None se il task non è supportato o supera le soglie (si usa Fast Downward)
+def run_local_planner(domain_text: str, problem_text: str, cwd: str = ".", plan_file: str = "sas_plan",
+                      optimal: bool = False) -> Optional[Tuple[bool, str, str]]:
+    started = time.perf_counter()
+    try:
+        check_sections(domain_text, problem_text)
+        task = ground(parse_pddl_domain(domain_text), parse_pddl_problem(problem_text))
+        plan = search(task, "bfs" if optimal else LOCAL_PLANNER_SEARCH)
+    except (UnsupportedTask, TaskTooLarge, ValueError) as e:
+        print(f"Planner locale non utilizzabile ({e}), uso Fast Downward")
+        return None
+    elapsed = f"Total time: {time.perf_counter() - started:.6f}s\n"
+    plan_path = os.path.join(cwd, plan_file)
+    if plan is None:
+        print("❌ Nessun piano trovato.")
+        if os.path.exists(plan_path):
+            os.remove(plan_path)
+        return False, UNSOLVABLE_LOG + elapsed, ""
+    with open(plan_path, "w") as f:
+        f.write(format_plan(plan))
+    print("✅ Piano trovato (planner locale):\n", format_plan(plan))
+    return True, f"Solution found!\nPlan length: {len(plan)} step(s).\n" + elapsed, ""
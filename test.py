@@ -1,7 +1,6 @@
-from typing import Tuple, List, Dict
+from typing import Tuple, List
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
-from pydantic import BaseModel, ValidationError
 from langchain_core.messages import AIMessage
 import subprocess
 import os
@@ -9,6 +8,10 @@ import json
 import sys
 import re
 from dotenv import load_dotenv
+from pddl_models import PDDLDomain, PDDLProblem, render_pddl_domain, render_pddl_problem
+from compiled_domain import compile_domain
+from world_state import FactTable, WorldState
+from play_engine import PlayEngine, read_plan
 
 load_dotenv()
 
@@ -18,27 +21,6 @@ sys.excepthook = sys.__excepthook__
 # Configura il modello
 llm = ChatOpenAI(model="gpt-4o", temperature=0)
 
-# Pydantic models
-class PDDLAction(BaseModel):
-    name: str
-    parameters: List[str]
-    preconditions: List[str]
-    effects: List[str]
-
-class PDDLDomain(BaseModel):
-    domain_name: str
-    requirements: List[str]
-    types: List[str]
-    predicates: List[str]
-    actions: List[PDDLAction]
-
-class PDDLProblem(BaseModel):
-    problem_name: str
-    domain_name: str
-    objects: Dict[str, str]
-    init: List[str]
-    goal: List[str]
-
 # Carica la narrativa iniziale
 try:
     with open("lore.txt", "r", encoding="utf-8") as file:
@@ -174,43 +156,6 @@ Effects:
     ("user", "Previous narrative:\n{narrative}\n\nPlayer's chosen action:\n{choice}\n\nPDDL Domain:\n{domain}\n\nPDDL Problem:\n{problem}\n\nEffects:\n{effects}")
 ])
 
-# Rendering PDDL
-def render_pddl_action(action: PDDLAction) -> str:
-    return f"""(:action {action.name}
-    :parameters ({' '.join(action.parameters)})
-    :precondition (and {' '.join(action.preconditions)})
-    :effect (and {' '.join(action.effects)})
-)"""
-
-def render_pddl_domain(domain: PDDLDomain) -> str:
-    requirements_str = " ".join(f":{r}" for r in domain.requirements)
-    types_str = " ".join(domain.types)
-    predicates_str = "\n    ".join(domain.predicates)
-    actions_str = "\n".join(render_pddl_action(a) for a in domain.actions)
-
-    return f"""(define (domain {domain.domain_name})
-(:requirements {requirements_str})
-(:types {types_str})
-(:predicates
-    {predicates_str})
-{actions_str}
-)"""
-
-def render_pddl_problem(problem: PDDLProblem) -> str:
-    objects_str = "\n    ".join(f"{name} - {type_}" for name, type_ in problem.objects.items())
-    init_str = "\n    ".join(problem.init)
-    goal_str = " ".join(problem.goal)
-
-    return f"""(define (problem {problem.problem_name})
-(:domain {problem.domain_name})
-(:objects
-    {objects_str})
-(:init
-    {init_str})
-(:goal
-    (and {goal_str}))
-)"""
-
 # Esecuzione Fast Downward
 def run_fast_downward(domain_file: str, problem_file: str) -> bool:
     cmd = ["./downward/fast-downward.py", domain_file, problem_file, "--search", "astar(lmcut())"]
@@ -232,50 +177,24 @@ def run_fast_downward(domain_file: str, problem_file: str) -> bool:
         return False
 
 # Funzione per applicare gli effetti di un'azione
-def apply_action_effects(action: str, domain: PDDLDomain, current_facts: set) -> set:
-    # Estrai il nome dell'azione e i parametri
-    action = action.strip().strip('()')
-    action_name, *params = action.split()
-    
-    # Trova l'azione nel dominio
-    for action_def in domain.actions:
-        if action_def.name == action_name.replace('_', '-'):
-            # Sostituisci i parametri formali con quelli effettivi
-            param_map = dict(zip([p.split('-')[0].strip('?') for p in action_def.parameters], params))
-            new_facts = set(current_facts)
-            
-            # Applica gli effetti
-            for effect in action_def.effects:
-                if effect.startswith('(not '):
-                    # Rimuovi il predicato negato
-                    predicate = effect[5:-1]  # Rimuove "(not " e ")"
-                    predicate = replace_params(predicate, param_map)
-                    new_facts.discard(predicate)
-                else:
-                    # Aggiungi il predicato positivo
-                    predicate = replace_params(effect, param_map)
-                    new_facts.add(predicate)
-            
-            return new_facts
-    print(f"⚠️ Azione {action_name} non trovata nel dominio.")
-    return current_facts
-
-# Funzione per sostituire i parametri nei predicati
-def replace_params(predicate: str, param_map: Dict[str, str]) -> str:
-    predicate = predicate.strip('()')
-    parts = predicate.split()
-    predicate_name = parts[0]
-    args = [param_map.get(arg, arg) for arg in parts[1:]]
-    return f"({predicate_name} {' '.join(args)})"
+def apply_action_effects(action: str, domain: PDDLDomain, current_facts: WorldState) -> WorldState:
+    # Indice delle azioni ed effetti già analizzati: un lookup e operazioni sui bit dello stato
+    compiled = compile_domain(domain)
+    try:
+        step = compiled.step(action)
+    except KeyError as e:
+        print(f"⚠️ Azione {e.args[0]} non trovata nel dominio.")
+        return current_facts
+    except ValueError as e:
+        print(f"⚠️ Azione {action} non valida: {e}")
+        return current_facts
+    return current_facts.apply(step)
 
 # Reflection Agent
-def reflectionAgent(domain: PDDLDomain, current_facts: set) -> Tuple[str, str, bool]:
-    try:
-        with open("sas_plan", "r", encoding="utf-8") as file:
-            lines = file.readlines()
-            sas_plan_actions = [line.strip() for line in lines if line.strip() and not line.startswith(";")]
-    except FileNotFoundError:
+def reflectionAgent(domain: PDDLDomain, current_facts: WorldState, plan: List[str]) -> Tuple[str, str, bool]:
+    if plan is None:
         return "Nessun piano trovato. La tua avventura termina qui.", "", False
+    sas_plan_actions = plan
 
     if not sas_plan_actions:
         return "Non ci sono azioni disponibili. Hai perso.", "", False
@@ -323,7 +242,7 @@ Current facts:
         ("user", f"Next action in the plan:\n{next_action}")
     ])
 
-    reflection = llm.invoke(problem_prompt.format_messages(domain=render_pddl_domain(domain), facts="\n".join(current_facts)))
+    reflection = llm.invoke(problem_prompt.format_messages(domain=render_pddl_domain(domain), facts="\n".join(current_facts.to_text())))
     print("\n" + reflection.content.strip() + "\n")
 
     while True:
@@ -337,15 +256,19 @@ Current facts:
 # Ciclo principale del gioco
 def main():
     narrative_input = lore_text.strip()
-    current_facts = set()
-    first_iteration = True
+    # Fatti internati: confronti e differenze tra turni sono operazioni su bit
+    fact_table = FactTable()
+    current_facts = WorldState(fact_table)
     domain_obj = None
+    engine = None
 
-    while True:
-        if not narrative_input:
-            print("❌ Nessuna narrativa fornita.")
-            break
+    if not narrative_input:
+        print("❌ Nessuna narrativa fornita.")
+        return
 
+    # Dominio e problema si generano una volta sola: ai turni successivi il piano
+    # si verifica dallo stato corrente e si ricalcola solo se serve
+    while engine is None:
         # Generazione dominio
         domain_raw = llm.invoke(domain_prompt.format_messages(narrative=narrative_input))
         if not isinstance(domain_raw, AIMessage):
@@ -386,18 +309,8 @@ def main():
             print("Contenuto ricevuto:", content)
             break
 
-        # Aggiornamento fatti
-        if first_iteration:
-            current_facts = set(problem_obj.init)
-            first_iteration = False
-            print("\n📋 Stato iniziale:", current_facts)
-        else:
-            new_facts = set(problem_obj.init)
-            added = new_facts - current_facts
-            removed = current_facts - new_facts
-            print("\n➕ Fatti aggiunti:", added)
-            print("\n➖ Fatti rimossi:", removed)
-            current_facts = new_facts
+        current_facts = WorldState.from_text(fact_table, problem_obj.init)
+        print("\n📋 Stato iniziale:", current_facts.to_text())
 
         problem_str = render_pddl_problem(problem_obj)
 
@@ -416,9 +329,14 @@ def main():
             print("❌ Impossibile proseguire: nessun piano valido.")
             print("Controlla fast_downward_log.txt per dettagli.")
             break
+        engine = PlayEngine(domain_obj, problem_obj, read_plan("sas_plan"), current_facts)
 
+    if engine is None:
+        return
+
+    while True:
         # ReflectionAgent
-        choice, executed_action, status = reflectionAgent(domain_obj, current_facts)
+        choice, executed_action, status = reflectionAgent(domain_obj, current_facts, engine.plan)
         print("\n🎯 Scelta del giocatore:", choice)
 
         if not status:
@@ -426,18 +344,19 @@ def main():
             break
 
         # Applica gli effetti dell'azione scelta
-        current_facts = apply_action_effects(executed_action, domain_obj, current_facts)
-        print("\n🔄 Stato aggiornato:", current_facts)
-
-        # Rimuovi l'azione eseguita dal piano
-        if os.path.exists("sas_plan"):
-            with open("sas_plan", "r") as f:
-                lines = f.readlines()
-            with open("sas_plan", "w") as f:
-                f.writelines(lines[1:])  # Rimuove la prima azione
+        new_facts = apply_action_effects(executed_action, domain_obj, current_facts)
+        added, removed = new_facts.diff(current_facts)
+        current_facts = new_facts
+        print("\n➕ Fatti aggiunti:", added.to_text())
+        print("\n➖ Fatti rimossi:", removed.to_text())
+
+        # Si toglie l'azione eseguita dal piano; si ripianifica solo se il resto non è più valido
+        engine.advance(executed_action, current_facts)
+        problem_obj.init = current_facts.to_text()
+        problem_str = render_pddl_problem(problem_obj)
 
         # Aggiornamento narrativa
-        effects_str = "\n".join(current_facts)
+        effects_str = "\n".join(current_facts.to_text())
         narrative_messages = narrative_prompt.format_messages(
             narrative=narrative_input,
             choice=choice,
@@ -454,8 +373,6 @@ def main():
             f.write(narrative_input)
 
         # Aggiorna il problema PDDL con il nuovo stato
-        problem_obj.init = list(current_facts)
-        problem_str = render_pddl_problem(problem_obj)
         with open("problem.pddl", "w", encoding="utf-8") as f:
             f.write(problem_str)
 
@@ -0,0 +1,21 @@
+from pddl_autofix import autofix_pddl_text
+
+
+def read(name):
+    with open(name, encoding="utf-8") as f:
+        return f.read()
+
+
+def with_section(domain, section):
+    end = domain.rfind(")")
+    return domain[:end] + section + ")"
+
+
+def test_bundled_task_is_fixed():
+    assert autofix_pddl_text(read("domain.pddl"), read("problem.pddl")) is not None
+
+
+def test_unmodelled_sections_are_not_rewritten():
+    problem = read("problem.pddl")
+    for section in ("(:derived (ready) (at-shore))", "(:functions (total-cost))"):
+        assert autofix_pddl_text(with_section(read("domain.pddl"), section), problem) is None
@@ -0,0 +1,56 @@
+from plan_cache import canonical_pddl, plan_key
+from planner import translate_key
+
+
+DOMAIN = """(define (domain grid)
+  (:requirements :strips :typing)
+  (:types cell)
+  (:predicates (at ?c - cell) (adjacent ?a - cell ?b - cell))
+  (:action move
+    :parameters ({params})
+    :precondition (and (at ?from) (adjacent ?from ?to))
+    :effect (and (not (at ?from)) (at ?to))))
+"""
+
+PROBLEM = """(define (problem grid-1) (:domain grid)
+  (:objects {objects})
+  (:init {init})
+  (:goal (at c2)))
+"""
+
+
+def domain(params="?from - cell ?to - cell"):
+    return DOMAIN.format(params=params)
+
+
+def problem(objects="c1 c2 - cell", init="(at c1) (adjacent c1 c2)"):
+    return PROBLEM.format(objects=objects, init=init)
+
+
+def test_reordered_parameters_change_the_canonical_form():
+    swapped = domain("?to - cell ?from - cell")
+    assert canonical_pddl(domain()) != canonical_pddl(swapped)
+
+
+def test_reordered_parameters_change_the_plan_key():
+    swapped = domain("?to - cell ?from - cell")
+    assert plan_key(domain(), problem()) != plan_key(swapped, problem())
+
+
+def test_reordered_parameters_change_the_sas_key():
+    swapped = domain("?to - cell ?from - cell")
+    assert translate_key(domain(), problem()) != translate_key(swapped, problem())
+
+
+def test_order_of_objects_and_facts_does_not_change_the_keys():
+    reordered = problem(objects="c2 c1 - cell", init="(adjacent c1 c2) (at c1)")
+    assert plan_key(domain(), problem()) == plan_key(domain(), reordered)
+    assert translate_key(domain(), problem()) == translate_key(domain(), reordered)
+
+
+def test_sas_key_depends_on_the_canonical_version(monkeypatch):
+    import planner
+
+    key = translate_key(domain(), problem())
+    monkeypatch.setattr(planner, "CANONICAL_VERSION", "0")
+    assert translate_key(domain(), problem()) != key
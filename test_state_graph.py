@@ -0,0 +1,29 @@
+from pddl_models import parse_pddl_domain, parse_pddl_problem
+from state_graph import DEAD_END, build_state_graph
+
+
+def bundled(max_states):
+    with open("domain.pddl", encoding="utf-8") as f:
+        domain = parse_pddl_domain(f.read())
+    with open("problem.pddl", encoding="utf-8") as f:
+        problem = parse_pddl_problem(f.read())
+    return build_state_graph(domain, problem, max_states=max_states)
+
+
+def test_truncated_graph_keeps_the_initial_distance():
+    graph = bundled(max_states=50)
+    assert graph.truncated
+    assert graph.node(0)["truncated"]
+    assert graph.distance[0] == 7
+
+    # Seguendo i suggerimenti si arriva alla vittoria
+    state = 0
+    for _ in range(graph.distance[0]):
+        hint = graph.hint(state)
+        state = next(succ for action, succ in graph.options(state) if action == hint)
+    assert graph.is_goal(state)
+
+
+def test_default_cap_reaches_the_goal():
+    graph = bundled(max_states=5000)
+    assert graph.distance[0] not in (None, DEAD_END)
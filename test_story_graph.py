@@ -0,0 +1,35 @@
+import re
+
+from story_graph import StoryStreamParser, parse_story
+
+
+def read_story():
+    with open("story.txt", encoding="utf-8") as f:
+        return f.read()
+
+
+def stream(story, size=37):
+    parser = StoryStreamParser()
+    nodes = {}
+    for start in range(0, len(story), size):
+        for node_id, node in parser.feed(story[start:start + size]).items():
+            assert node_id not in nodes
+            nodes[node_id] = node
+    nodes.update(parser.finish())
+    return nodes
+
+
+def test_streamed_nodes_match_the_parsed_story():
+    story = read_story()
+    assert stream(story) == parse_story(story)
+
+
+def test_stray_separator_does_not_publish_a_partial_node():
+    story = read_story()
+    # "---" tra la descrizione e le scelte del primo nodo
+    story = story.replace("**Choices:**", "---\n\n**Choices:**", 1)
+    parser = StoryStreamParser()
+    head = re.split(r"\n2\s*\n", story, maxsplit=1)[0]
+    assert parser.feed(head + "\n") == {}
+    assert stream(story)["node_1"] == parse_story(story)["node_1"]
+    assert parse_story(story)["node_1"]["options"]
@@ -0,0 +1,40 @@
+from pddl_models import parse_pddl_domain, parse_pddl_problem
+from strips_planner import UnsupportedTask, ground, solve
+
+DOMAIN = """(define (domain pass)
+  (:requirements :strips :typing :equality)
+  (:types room)
+  (:predicates (at ?r - room) (door ?a - room ?b - room))
+  (:action move
+    :parameters (?from - room ?to - room)
+    :precondition (and (at ?from) (door ?from ?to) (not (= ?from ?to)))
+    :effect (and (not (at ?from)) (at ?to))))
+"""
+
+PROBLEM = """(define (problem pass-1)
+  (:domain pass)
+  (:objects hall cellar vault - room)
+  (:init (at hall) (door hall hall) (door hall cellar) (door cellar vault))
+  (:goal (and (at vault) (not (= hall vault)))))
+"""
+
+
+def test_equality_preconditions_are_grounded():
+    task = ground(parse_pddl_domain(DOMAIN), parse_pddl_problem(PROBLEM))
+    assert all(action.args[0] != action.args[1] for action in task.actions)
+    plan = solve(parse_pddl_domain(DOMAIN), parse_pddl_problem(PROBLEM), "bfs")
+    assert [action.args for action in plan] == [("hall", "cellar"), ("cellar", "vault")]
+
+
+def test_false_equality_goal_is_unsolvable():
+    problem = PROBLEM.replace("(not (= hall vault))", "(= hall vault)")
+    assert solve(parse_pddl_domain(DOMAIN), parse_pddl_problem(problem), "bfs") is None
+
+
+def test_equality_effects_are_rejected():
+    domain = DOMAIN.replace("(at ?to))))", "(at ?to) (= ?from ?to))))")
+    try:
+        ground(parse_pddl_domain(domain), parse_pddl_problem(PROBLEM))
+    except UnsupportedTask:
+        return
+    raise AssertionError("UnsupportedTask not raised")
@@ -0,0 +1,35 @@
+import os
+import threading
+
+import workspace
+from workspace import Workspace
+
+
+def test_concurrent_publishes_do_not_collide(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace, "WORKSPACES_DIR", str(tmp_path / "workspaces"))
+    dest = str(tmp_path / "story.txt")
+    sources = []
+    for i in range(16):
+        ws = Workspace.create(prefix=f"job-{i}-")
+        ws.write("story.txt", f"{i}\n" * 2000)
+        sources.append(ws)
+    errors = []
+
+    def publish(ws):
+        try:
+            for _ in range(10):
+                ws.publish("story.txt", dest)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=publish, args=(ws,)) for ws in sources]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    with open(dest) as f:
+        lines = f.read().splitlines()
+    assert len(set(lines)) == 1 and len(lines) == 2000
@@ -0,0 +1,71 @@
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+
+
+# Contabilità dei token per chiamata LLM, esposta nello stato della pipeline e nel risultato del job
+def estimate_tokens(text: str) -> int:
+    # Stima grossolana (circa 4 caratteri per token) quando il provider non riporta l'uso
+    return (len(text) + 3) // 4
+
+
+def message_text(messages: Sequence[BaseMessage]) -> str:
+    return "\n".join(m.content if isinstance(m.content, str) else str(m.content) for m in messages)
+
+
+class LLMCall(NamedTuple):
+    stage: str
+    input_tokens: int
+    output_tokens: int
+    cached_input_tokens: int
+    latency: float
+    cache_hit: bool
+    estimated: bool
+
+
+class TokenUsage:
+    def __init__(self):
+        self.calls: List[LLMCall] = []
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, messages: Sequence[BaseMessage], output: str,
+               usage: Optional[dict], latency: float, cache_hit: bool = False):
+        if cache_hit:
+            # Le risposte dalla cache locale non consumano token del provider
+            call = LLMCall(stage, 0, 0, 0, latency, True, False)
+        elif usage:
+            call = LLMCall(
+                stage, usage.get("input_tokens", 0), usage.get("output_tokens", 0),
+                (usage.get("input_token_details") or {}).get("cache_read", 0) or 0,
+                latency, cache_hit, False,
+            )
+        else:
+            call = LLMCall(stage, estimate_tokens(message_text(messages)), estimate_tokens(output), 0,
+                           latency, cache_hit, True)
+        with self._lock:
+            self.calls.append(call)
+
+    def totals(self) -> dict:
+        with self._lock:
+            calls = list(self.calls)
+        stages: Dict[str, dict] = {}
+        for call in calls:
+            entry = stages.setdefault(call.stage or "other", {
+                "calls": 0, "input_tokens": 0, "output_tokens": 0, "cached_input_tokens": 0, "latency": 0.0,
+            })
+            entry["calls"] += 1
+            entry["input_tokens"] += call.input_tokens
+            entry["output_tokens"] += call.output_tokens
+            entry["cached_input_tokens"] += call.cached_input_tokens
+            entry["latency"] = round(entry["latency"] + call.latency, 3)
+        return {
+            "calls": len(calls),
+            "input_tokens": sum(c.input_tokens for c in calls),
+            "output_tokens": sum(c.output_tokens for c in calls),
+            "cached_input_tokens": sum(c.cached_input_tokens for c in calls),
+            "cache_hits": sum(1 for c in calls if c.cache_hit),
+            "estimated": any(c.estimated for c in calls),
+            "latency": round(sum(c.latency for c in calls), 3),
+            "stages": stages,
+        }
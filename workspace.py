@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+
+
+WORKSPACES_DIR = os.getenv("QUESTMASTER_WORKSPACES", "workspaces")
+
+
+# Cartella di lavoro di una singola esecuzione della pipeline
+class Workspace:
+    def __init__(self, root: str = "."):
+        self.root = root
+
+    @classmethod
+    def create(cls, prefix: str = "run-") -> "Workspace":
+        os.makedirs(WORKSPACES_DIR, exist_ok=True)
+        return cls(os.path.abspath(tempfile.mkdtemp(prefix=prefix, dir=WORKSPACES_DIR)))
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self.path(name))
+
+    def read(self, name: str) -> str:
+        with open(self.path(name), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def write(self, name: str, content: str):
+        with open(self.path(name), "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def remove(self, name: str):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    # Copia atomica di un file del workspace in un'altra posizione; il file temporaneo ha un
+    # nome unico nella cartella di destinazione, così pubblicazioni concorrenti non si pestano
+    def publish(self, name: str, dest: str):
+        fd, tmp_dest = tempfile.mkstemp(prefix=f".{os.path.basename(dest)}.", suffix=".tmp",
+                                        dir=os.path.dirname(os.path.abspath(dest)))
+        try:
+            with os.fdopen(fd, "wb") as out, open(self.path(name), "rb") as src:
+                shutil.copyfileobj(src, out)
+            # mkstemp crea il file con permessi 0600: si riprendono quelli del file del workspace
+            shutil.copymode(self.path(name), tmp_dest)
+            os.replace(tmp_dest, dest)
+        except BaseException:
+            try:
+                os.remove(tmp_dest)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def cleanup(self):
+        if os.path.abspath(self.root) != os.path.abspath("."):
+            shutil.rmtree(self.root, ignore_errors=True)
@@ -0,0 +1,126 @@
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from compiled_domain import Fact, GroundStep, facts_from_text, parse_fact
+
+
+# Stato del mondo compatto: predicati e oggetti internati in interi,
+# ogni fatto ground ha un bit e lo stato è un intero usato come bitset
+class FactTable:
+    def __init__(self):
+        self.symbols: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.ids: Dict[Tuple[int, ...], int] = {}
+        self.facts: List[Tuple[int, ...]] = []
+        self._texts: List[str] = []
+        self._masks: Dict[GroundStep, Tuple[int, int, int, int]] = {}
+
+    def symbol(self, name: str) -> int:
+        sid = self.symbols.get(name)
+        if sid is None:
+            sid = self.symbols[name] = len(self.names)
+            self.names.append(name)
+        return sid
+
+    def fact_id(self, fact: Fact) -> int:
+        key = tuple(self.symbol(s) for s in fact)
+        fid = self.ids.get(key)
+        if fid is None:
+            fid = self.ids[key] = len(self.facts)
+            self.facts.append(key)
+            self._texts.append("")
+        return fid
+
+    def fact(self, fid: int) -> Fact:
+        return tuple(self.names[s] for s in self.facts[fid])
+
+    # Il testo PDDL si costruisce solo quando serve, una volta per fatto
+    def text(self, fid: int) -> str:
+        text = self._texts[fid]
+        if not text:
+            text = self._texts[fid] = f"({' '.join(self.fact(fid))})"
+        return text
+
+    def mask(self, facts: Iterable[Fact]) -> int:
+        bits = 0
+        for fact in facts:
+            bits |= 1 << self.fact_id(fact)
+        return bits
+
+    # Maschere (pre_pos, pre_neg, delete, add) di un'azione ground, calcolate una volta sola
+    def step_masks(self, step: GroundStep) -> Tuple[int, int, int, int]:
+        masks = self._masks.get(step)
+        if masks is None:
+            masks = self._masks[step] = (
+                self.mask(step.pre_pos), self.mask(step.pre_neg), self.mask(step.delete), self.mask(step.add),
+            )
+        return masks
+
+
+def _ids(bits: int) -> Iterator[int]:
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class WorldState:
+    __slots__ = ("table", "bits")
+
+    def __init__(self, table: FactTable, bits: int = 0):
+        self.table = table
+        self.bits = bits
+
+    @classmethod
+    def from_facts(cls, table: FactTable, facts: Iterable[Fact]) -> "WorldState":
+        return cls(table, table.mask(facts))
+
+    @classmethod
+    def from_text(cls, table: FactTable, items: Iterable[str]) -> "WorldState":
+        return cls.from_facts(table, facts_from_text(items))
+
+    def __contains__(self, fact: Union[Fact, str]) -> bool:
+        if isinstance(fact, str):
+            fact = parse_fact(fact)
+        key = tuple(self.table.symbols.get(s, -1) for s in fact)
+        fid = self.table.ids.get(key)
+        return fid is not None and bool(self.bits >> fid & 1)
+
+    def __len__(self) -> int:
+        return self.bits.bit_count()
+
+    def __iter__(self) -> Iterator[Fact]:
+        return (self.table.fact(fid) for fid in _ids(self.bits))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, WorldState) and self.table is other.table and self.bits == other.bits
+
+    def __hash__(self) -> int:
+        return hash(self.bits)
+
+    def __or__(self, other: "WorldState") -> "WorldState":
+        return WorldState(self.table, self.bits | other.bits)
+
+    def __and__(self, other: "WorldState") -> "WorldState":
+        return WorldState(self.table, self.bits & other.bits)
+
+    def __sub__(self, other: "WorldState") -> "WorldState":
+        return WorldState(self.table, self.bits & ~other.bits)
+
+    # (aggiunti, rimossi) rispetto a uno stato precedente
+    def diff(self, previous: "WorldState") -> Tuple["WorldState", "WorldState"]:
+        changed = self.bits ^ previous.bits
+        return WorldState(self.table, changed & self.bits), WorldState(self.table, changed & previous.bits)
+
+    def apply(self, step: GroundStep) -> "WorldState":
+        _, _, delete, add = self.table.step_masks(step)
+        return WorldState(self.table, (self.bits & ~delete) | add)
+
+    def is_applicable(self, step: GroundStep) -> bool:
+        pre_pos, pre_neg, _, _ = self.table.step_masks(step)
+        return self.bits & pre_pos == pre_pos and not self.bits & pre_neg
+
+    def to_text(self) -> List[str]:
+        return [self.table.text(fid) for fid in _ids(self.bits)]
+
+    def __repr__(self) -> str:
+        return f"WorldState({', '.join(self.to_text())})"
@@ -0,0 +1,29 @@
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+from flask import Blueprint, Flask
+from flask_cors import CORS
+
+# Il .env va letto prima dei moduli che leggono la configurazione all'import
+load_dotenv()
+
+from graph_api import graph_api
+
+
+# Entry point di produzione: gunicorn -c gunicorn.conf.py (wsgi_app = "wsgi:create_app()").
+# "all" serve grafo e generazione; "read" solo le route di lettura del grafo, per le repliche
+SERVER_ROLE = os.getenv("QUESTMASTER_ROLE", "all")
+
+
+def create_app(role: str = SERVER_ROLE, generation: Optional[Blueprint] = None) -> Flask:
+    if role not in ("all", "read"):
+        raise ValueError(f"Unknown QUESTMASTER_ROLE '{role}' (expected 'all' or 'read')")
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(graph_api)
+    if role == "all":
+        if generation is None:
+            from QuestMaster import generation_api as generation
+        app.register_blueprint(generation)
+    return app